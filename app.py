@@ -1,13 +1,68 @@
 import streamlit as st
-import cv2
-import requests
 import base64
+import hashlib
+import importlib
+import importlib.util
+import io
 import json
+import mmap
 import os
+import queue
+import re
+import sys
 import tempfile
-from datetime import datetime
-from PIL import Image
-import numpy as np
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from shopping_core import (
+    UNIT_FACTORS, bk_insert, bk_search, category_spent, get_ledger, ledger_add, month_spent,
+    new_backend_pool, parse_label_text, recent_months, run_backend_health_checks,
+    send_to_backends, spending_trend, to_number
+)
+
+# ─────────────────────────────────────────────
+# LAZY IMPORTS
+# ─────────────────────────────────────────────
+SCRIPT_START = time.perf_counter()
+
+@st.cache_resource
+def get_startup_profile():
+    """Process-wide record of cold import times and the first script run"""
+    return {"process_start": time.time(), "imports": {}, "first_run_seconds": None}
+
+def timed_import(name):
+    """Import a module, recording how long the first import in this process took"""
+    # Always go through the import system: it blocks on a module another thread is still
+    # initialising, whereas sys.modules would hand back the half-built module
+    cold = name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if cold:
+        get_startup_profile()["imports"].setdefault(name, time.perf_counter() - start)
+    return module
+
+class LazyModule:
+    """Stand-in that imports the real module on first attribute access"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = timed_import(self._name)
+        return getattr(self._module, attr)
+
+@st.cache_resource
+def has_module(name):
+    """Whether an optional dependency is installed, checked once per process"""
+    return importlib.util.find_spec(name) is not None
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+requests = LazyModule("requests")
+Image = LazyModule("PIL.Image")
 
 # ─────────────────────────────────────────────
 # PAGE CONFIG
@@ -187,20 +242,63 @@ st.markdown("""
 # HELPER FUNCTIONS
 # ─────────────────────────────────────────────
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST_URL", "http://localhost:11434")
+# Backend pool: "url=model|model,url" — a url without models serves every model
+OLLAMA_BACKENDS = os.environ.get("OLLAMA_BACKENDS", OLLAMA_HOST)
+VISION_MODEL = "llava"
+TEXT_MODEL = "llama3"
+# How long Ollama keeps a model resident after a request ("30m", "1h", "-1" = forever)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
 DATA_FILE = "shopping_data.json"
 
+# Per-session memory limits
+MAX_CHAT_HISTORY = 50
+MAX_SESSION_IMAGES = 8
+MAX_IMAGE_SIDE = 1600
+SESSION_IDLE_SECONDS = 30 * 60
+
+# Vision Quick Actions: two-hop (llava describes → llama3 answers) or one-hop
+# (llava answers the final question directly from the image)
+VISION_ACTIONS = {
+    "worth_buying": "💡 Worth Buying?",
+    "health_score": "❤️ Health Score",
+    "expiry": "📅 Expiry Check",
+    "allergens": "🌿 Allergens",
+    "price_per_unit": "💰 Price Per Unit",
+    "alternatives": "🔄 Alternatives",
+    "shopping_list": "📋 Read My List",
+    "what_is_this": "🍽️ What Is This?",
+    "safety_tips": "🛡️ Safety Tips"
+}
+ONE_HOP_ACTIONS = [a for a in os.environ.get("ONE_HOP_ACTIONS", "").split(",") if a in VISION_ACTIONS]
+
+# Fragments rerun only their own function when their widgets change
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
+
+@st.cache_data(max_entries=1)
+def read_data_file(mtime):
+    """Parse the data file once per modification time, each caller gets a copy"""
+    with open(DATA_FILE, "r") as f:
+        return json.load(f)
+
 def load_data():
     """Load saved shopping data"""
     if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
+        return read_data_file(os.path.getmtime(DATA_FILE))
     return {
         "history": [],
-        "budget": {"monthly_limit": 0, "spent": 0},
-        "wishlist": []
+        "budget": {"monthly_limit": 0},
+        "wishlist": [],
+        "scans": [],
+        "ledger": {"entries": [], "monthly": {}, "by_category": {}}
     }
 
+def get_data():
+    """This session's saved data, read from disk on first access"""
+    if "data" not in st.session_state:
+        st.session_state.data = load_data()
+    return st.session_state.data
+
 def save_data(data):
     """Save shopping data"""
     with open(DATA_FILE, "w") as f:
@@ -208,22 +306,43 @@ def save_data(data):
 
 def image_to_base64(image):
     """Convert PIL image to base64"""
-    import io
     buffer = io.BytesIO()
     image.save(buffer, format="JPEG")
     return base64.b64encode(buffer.getvalue()).decode()
 
-def ask_llava(image, question):
+@st.cache_resource
+def get_backend_pool():
+    """Shared Ollama backend pool with a background health checker"""
+    pool = new_backend_pool(OLLAMA_BACKENDS)
+    threading.Thread(target=run_backend_health_checks, args=(pool,), daemon=True).start()
+    return pool
+
+def post_to_ollama(path, payload, timeout, stream=False):
+    """POST to the best backend for payload["model"], failing over on connection errors"""
+    prefetcher = get_prefetcher()
+    interactive = not getattr(prefetcher["local"], "background", False)
+    if interactive:
+        begin_interactive(prefetcher)
+    try:
+        return send_to_backends(get_backend_pool(), path, payload, timeout, stream)
+    finally:
+        if interactive:
+            end_interactive(prefetcher)
+
+def ask_llava(image, question, json_mode=False):
     """Send image + question to LLaVA"""
     try:
         img_b64 = image_to_base64(image)
         payload = {
-            "model": "llava",
+            "model": VISION_MODEL,
             "prompt": question,
             "images": [img_b64],
-            "stream": False
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60)
+        if json_mode:
+            payload["format"] = "json"
+        response = post_to_ollama("/api/generate", payload, timeout=60)
         if response.status_code == 200:
             return response.json().get("response", "Could not get response")
         return f"Error: {response.status_code}"
@@ -234,25 +353,184 @@ def ask_llava(image, question):
 
 def ask_llama(prompt):
     """Send text prompt to LLaMA 3"""
+    return ask_llama_with_context(prompt)[0]
+
+def ask_llama_with_context(prompt, context=None):
+    """Send text prompt to LLaMA 3, continuing from Ollama context tokens if given"""
     try:
         payload = {
-            "model": "llama3",
+            "model": TEXT_MODEL,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60)
+        if context:
+            payload["context"] = context
+        response = post_to_ollama("/api/generate", payload, timeout=60)
         if response.status_code == 200:
-            return response.json().get("response", "Could not get response")
-        return f"Error: {response.status_code}"
+            body = response.json()
+            return body.get("response", "Could not get response"), body.get("context")
+        return f"Error: {response.status_code}", None
     except requests.exceptions.ConnectionError:
-        return "⚠️ Ollama not running. Please start Ollama first: run 'ollama serve' in terminal"
+        return "⚠️ Ollama not running. Please start Ollama first: run 'ollama serve' in terminal", None
     except Exception as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", None
+
+def ask_followup(session, source, first_prompt, followup_prompt):
+    """Ask a follow-up question, re-sending the source text only when it changed"""
+    conversations = st.session_state.setdefault("llm_conversations", {})
+    convo = conversations.get(session)
+    if convo and convo["source"] == source and convo["context"]:
+        result, context = ask_llama_with_context(followup_prompt, convo["context"])
+    else:
+        result, context = ask_llama_with_context(first_prompt)
+    if context:
+        conversations[session] = {"source": source, "context": context}
+    else:
+        conversations.pop(session, None)
+    return result
+
+def ask_vision_action(action, image, vision_question, build_prompt, known_context=None, one_hop=None):
+    """Answer a vision Quick Action, returns (context, answer)"""
+    if known_context:
+        return known_context, ask_llama(build_prompt(known_context))
+    if one_hop is None:
+        one_hop = st.session_state.get("one_hop_actions", ONE_HOP_ACTIONS)
+    if action in one_hop:
+        result = ask_llava(image, build_prompt("the item shown in this image"))
+        return result, result
+    vision = ask_llava(image, vision_question)
+    return vision, ask_llama(build_prompt(vision))
+
+# Vision question and final prompt for each product Quick Action
+PRODUCT_ACTIONS = {
+    "worth_buying": (
+        "Describe this product in detail including name, brand, price if visible, ingredients, and any other details you can see on the label.",
+        lambda vision: f"""Based on this product: {vision}
+
+Tell me:
+1. What is this product?
+2. Is it worth buying? (value for money)
+3. Pros and cons
+4. Overall verdict (Buy / Skip / Maybe)
+
+Be honest and concise."""
+    ),
+    "health_score": (
+        "Read all ingredients, nutritional information, sugar content, sodium, fats from this product label.",
+        lambda vision: f"""Based on this product: {vision}
+
+Give me:
+1. Health score out of 10
+2. Main health concerns
+3. Who should avoid this
+4. Healthier alternatives
+
+Be direct and honest."""
+    ),
+    "expiry": (
+        "Find and read the expiry date, best before date, or manufacturing date on this product.",
+        lambda vision: f"""Based on: {vision}
+
+Tell me:
+1. Expiry/best before date
+2. Is it safe to buy/consume now?
+3. How long until expiry
+4. Storage advice
+
+Today's date: {datetime.now().strftime('%d %B %Y')}"""
+    ),
+    "allergens": (
+        "Read all ingredients and allergen warnings from this product label.",
+        lambda vision: f"""Based on: {vision}
+
+List:
+1. All allergens present
+2. May contain warnings
+3. Safe for: vegetarians/vegans/gluten-free/diabetics
+4. Hidden allergens to watch out for"""
+    ),
+    "price_per_unit": (
+        "Read the price, weight/volume/quantity from this product.",
+        lambda vision: f"""Based on: {vision}
+
+Calculate:
+1. Price per gram/ml/unit
+2. Is this good value compared to typical market prices?
+3. Better value size/brand recommendations"""
+    ),
+    "alternatives": (
+        "What product is this? Brand, type, price if visible.",
+        lambda vision: f"""Based on: {vision}
+
+Suggest:
+1. 3 cheaper alternatives
+2. 3 healthier alternatives  
+3. Best overall alternative and why"""
+    )
+}
+
+def warm_up_model(model):
+    """Load a model into memory on every backend that serves it"""
+    payload = {"model": model, "prompt": "", "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE}
+    warmed = 0
+    for backend in get_backend_pool()["backends"].values():
+        if backend["models"] is not None and model not in backend["models"]:
+            continue
+        try:
+            response = requests.post(f"{backend['url']}/api/generate", json=payload, timeout=120)
+            warmed += response.status_code == 200
+        except Exception:
+            pass
+    return warmed
+
+@st.cache_resource
+def start_model_warm_up():
+    """Pre-load both models once per server process, in the background"""
+    thread = threading.Thread(
+        target=lambda: [warm_up_model(m) for m in (VISION_MODEL, TEXT_MODEL)],
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def check_backend_health(backend):
+    """Report which models one Ollama backend has loaded and their memory use"""
+    served = [m for m in (VISION_MODEL, TEXT_MODEL) if backend["models"] is None or m in backend["models"]]
+    report = {"url": backend["url"], "in_flight": backend["in_flight"], "ok": False, "error": "", "models": []}
+    try:
+        response = requests.get(f"{backend['url']}/api/ps", timeout=5)
+        if response.status_code != 200:
+            report["error"] = f"Error: {response.status_code}"
+            return report
+        loaded = {}
+        for m in response.json().get("models", []):
+            loaded[m.get("name", "").split(":")[0]] = {
+                "name": m.get("name", ""),
+                "size_gb": round(m.get("size", 0) / 1024 ** 3, 2),
+                "vram_gb": round(m.get("size_vram", 0) / 1024 ** 3, 2),
+                "expires_at": m.get("expires_at", "")
+            }
+        for model in served:
+            info = loaded.get(model, {"name": model, "size_gb": 0, "vram_gb": 0, "expires_at": ""})
+            report["models"].append({**info, "loaded": model in loaded})
+        report["ok"] = True
+    except requests.exceptions.ConnectionError:
+        report["error"] = "⚠️ Ollama not running"
+    except Exception as e:
+        report["error"] = f"Error: {str(e)}"
+    return report
+
+def check_ollama_health():
+    """Health report for every backend in the pool"""
+    return [check_backend_health(b) for b in list(get_backend_pool()["backends"].values())]
 
 def scan_barcode(image):
     """Scan barcode from image using pyzbar"""
+    if not has_module("pyzbar"):
+        return "pyzbar not installed. Run: pip install pyzbar"
     try:
-        from pyzbar import pyzbar
+        pyzbar = timed_import("pyzbar.pyzbar")
         img_array = np.array(image)
         img_gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
         barcodes = pyzbar.decode(img_gray)
@@ -271,30 +549,887 @@ def scan_barcode(image):
 
 def speak_text(text):
     """Convert text to speech using gTTS"""
+    if not has_module("gtts"):
+        return None
     try:
-        from gtts import gTTS
-        import pygame
-        tts = gTTS(text=text[:500], lang='en', slow=False)
+        tts = timed_import("gtts").gTTS(text=text[:500], lang='en', slow=False)
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as f:
             tts.save(f.name)
+            track_temp_file(f.name)
             return f.name
     except ImportError:
         return None
     except Exception:
         return None
 
+@st.cache_resource
+def get_whisper_model():
+    """Load the Whisper model once per process"""
+    return timed_import("whisper").load_model("base")
+
 def transcribe_voice(audio_file):
     """Transcribe voice using Whisper"""
+    if not has_module("whisper"):
+        return "Whisper not installed. Run: pip install openai-whisper"
     try:
-        import whisper
-        model = whisper.load_model("base")
-        result = model.transcribe(audio_file)
+        result = get_whisper_model().transcribe(audio_file)
         return result["text"]
     except ImportError:
         return "Whisper not installed. Run: pip install openai-whisper"
     except Exception as e:
         return f"Error: {str(e)}"
 
+# ─────────────────────────────────────────────
+# LABEL OCR
+# ─────────────────────────────────────────────
+
+# Below this mean word confidence (0-100) OCR results are not trusted
+OCR_CONFIDENCE_THRESHOLD = 60
+
+def ocr_image(image):
+    """Read printed text with Tesseract, returns (text, mean word confidence)"""
+    if not has_module("pytesseract"):
+        return "", 0.0
+    try:
+        pytesseract = timed_import("pytesseract")
+        gray = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        data = pytesseract.image_to_data(binary, output_type=pytesseract.Output.DICT)
+        lines, confidences = {}, []
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if not word.strip() or conf < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(conf)
+        if not confidences:
+            return "", 0.0
+        text = "\n".join(" ".join(words) for words in lines.values())
+        return text, sum(confidences) / len(confidences)
+    except ImportError:
+        return "", 0.0
+    except Exception:
+        return "", 0.0
+
+def read_label(image):
+    """OCR a product label and parse its facts"""
+    text, confidence = ocr_image(image)
+    return {"text": text, "confidence": confidence, **parse_label_text(text)}
+
+def price_per_unit_answer(label):
+    """Deterministic price-per-unit answer, or None if OCR is not good enough"""
+    if label["confidence"] < OCR_CONFIDENCE_THRESHOLD or not label["mrp"] or not label["quantity"]:
+        return None
+    per_unit = label["mrp"] / label["quantity"]
+    big_unit = "kg" if label["unit"] == "g" else "litre"
+    return (f"<b>MRP:</b> ₹{label['mrp']:g} for {label['quantity']:g} {label['unit']}<br>"
+            f"<b>Price per {label['unit']}:</b> ₹{per_unit:.3f}<br>"
+            f"<b>Price per 100 {label['unit']}:</b> ₹{per_unit * 100:.2f}<br>"
+            f"<b>Price per {big_unit}:</b> ₹{per_unit * 1000:.2f}<br>"
+            f"<small>Read from label text (OCR confidence {label['confidence']:.0f}%)</small>")
+
+def expiry_answer(label, today=None):
+    """Deterministic expiry answer, or None if OCR is not good enough"""
+    if label["confidence"] < OCR_CONFIDENCE_THRESHOLD or not label["exp"]:
+        return None
+    today = today or date.today()
+    days_left = (label["exp"] - today).days
+    if days_left < 0:
+        status = f"❌ Expired {-days_left} days ago — do not buy or consume"
+    elif days_left <= 7:
+        status = f"⚠️ Expires in {days_left} days — consume soon"
+    else:
+        status = f"✅ Safe — {days_left} days until expiry"
+    mfg = f"<b>Manufactured:</b> {label['mfg'].strftime('%d %B %Y')}<br>" if label["mfg"] else ""
+    return (f"{mfg}<b>Expiry / best before:</b> {label['exp'].strftime('%d %B %Y')}<br>"
+            f"<b>Status:</b> {status}<br>"
+            f"<small>Read from label text (OCR confidence {label['confidence']:.0f}%)</small>")
+
+# ─────────────────────────────────────────────
+# DISH RECOGNITION
+# ─────────────────────────────────────────────
+
+DISH_CLASSIFIER_MODEL = "clip-ViT-B-32"
+# Local matches at or above this confidence (0-1) skip the vision model
+DISH_CONFIDENCE_THRESHOLD = 0.6
+# Cosine similarity the winning match must also reach: softmax alone is confident
+# about whichever dish is least unlike a photo of a shop front or a biscuit packet
+DISH_MIN_TEXT_SIMILARITY = 0.25
+DISH_MIN_PHOTO_SIMILARITY = 0.8
+# Optional labelled photos: dish_references/<Dish Name>/*.jpg
+DISH_REFERENCE_DIR = "dish_references"
+STREET_FOODS = [
+    "Pani Puri", "Bhel Puri", "Sev Puri", "Dahi Puri", "Masala Dosa", "Rava Dosa",
+    "Idli", "Medu Vada", "Uttapam", "Vada Pav", "Pav Bhaji", "Misal Pav", "Dabeli",
+    "Samosa", "Aloo Tikki", "Chole Bhature", "Kathi Roll", "Egg Roll", "Momos",
+    "Chicken Biryani", "Veg Biryani", "Parotta", "Kothu Parotta", "Bajji", "Pakora",
+    "Gobi Manchurian", "Jalebi", "Kulfi", "Falooda", "Sundal", "Murukku", "Poha",
+    "Puttu", "Sugarcane Juice", "Masala Chai"
+]
+# Competing captions that win for photos which are not one of the known dishes
+NOT_A_DISH = [
+    "a photo of a food stall or street vendor", "a photo of a packaged food product",
+    "a photo of a restaurant menu", "a photo of a person", "a photo of some other dish"
+]
+
+@st.cache_resource
+def get_dish_index():
+    """CLIP model plus normalised embeddings of every known dish, or None"""
+    # Cached either way, so a missing or broken model is not reloaded on every click
+    if not has_module("sentence_transformers"):
+        return None
+    try:
+        SentenceTransformer = timed_import("sentence_transformers").SentenceTransformer
+        model = SentenceTransformer(DISH_CLASSIFIER_MODEL, device="cpu")
+        captions = [f"a photo of {d}, Indian street food" for d in STREET_FOODS] + NOT_A_DISH
+        text_vectors = model.encode(captions, normalize_embeddings=True)
+    except Exception:
+        return None
+    photo_labels, photo_vectors = [], []
+    if os.path.isdir(DISH_REFERENCE_DIR):
+        for dish in sorted(os.listdir(DISH_REFERENCE_DIR)):
+            folder = os.path.join(DISH_REFERENCE_DIR, dish)
+            if not os.path.isdir(folder):
+                continue
+            photos = []
+            for name in sorted(os.listdir(folder)):
+                if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+                    continue
+                try:
+                    photos.append(Image.open(os.path.join(folder, name)).convert("RGB"))
+                except Exception:
+                    continue
+            if photos:
+                photo_vectors.append(model.encode(photos, normalize_embeddings=True))
+                photo_labels += [dish] * len(photos)
+    return {
+        "model": model,
+        "text_labels": list(STREET_FOODS) + [None] * len(NOT_A_DISH),
+        "text_vectors": text_vectors,
+        "photo_labels": photo_labels,
+        "photo_vectors": np.vstack(photo_vectors) if photo_vectors else None
+    }
+
+def best_match(labels, similarities):
+    """(label, similarity, softmax probability) of the best label, scoring each by its nearest neighbour"""
+    best = {}
+    for label, similarity in zip(labels, similarities):
+        best[label] = max(best.get(label, -1.0), float(similarity))
+    names = list(best)
+    # CLIP logit scale is 100
+    scores = np.array([best[n] for n in names]) * 100
+    probs = np.exp(scores - scores.max())
+    probs /= probs.sum()
+    i = int(probs.argmax())
+    return names[i], best[names[i]], float(probs[i])
+
+def classify_dish(image):
+    """Name the dish with the local classifier, returns (dish, confidence)"""
+    try:
+        index = get_dish_index()
+        if index is None:
+            return None, 0.0
+        query = index["model"].encode([image.convert("RGB")], normalize_embeddings=True)[0]
+        # Image-to-photo similarities run far higher than image-to-caption ones, so the
+        # captions and the reference photos are scored separately and never mixed
+        candidates = []
+        dish, similarity, confidence = best_match(index["text_labels"], index["text_vectors"] @ query)
+        if dish is not None and similarity >= DISH_MIN_TEXT_SIMILARITY:
+            candidates.append((confidence, dish))
+        if index["photo_vectors"] is not None:
+            dish, similarity, confidence = best_match(index["photo_labels"], index["photo_vectors"] @ query)
+            if similarity >= DISH_MIN_PHOTO_SIMILARITY:
+                candidates.append((confidence, dish))
+        if not candidates:
+            return None, 0.0
+        confidence, dish = max(candidates)
+        return dish, confidence
+    except Exception:
+        return None, 0.0
+
+def recognise_dish(image):
+    """Dish name if the local classifier is confident, else None"""
+    dish, confidence = classify_dish(image)
+    return dish if dish and confidence >= DISH_CONFIDENCE_THRESHOLD else None
+
+def identify_dish(image, question="What dish is this?"):
+    """Food context from the local classifier, falling back to LLaVA"""
+    return recognise_dish(image) or ask_llava(image, question)
+
+# ─────────────────────────────────────────────
+# DISH KNOWLEDGE STORE
+# ─────────────────────────────────────────────
+
+# Append-only lines of "dish<TAB>topic<TAB>prompt version<TAB>json answer"
+DISH_KNOWLEDGE_FILE = "dish_knowledge.tsv"
+DISH_PROMPTS = {
+    "story": """For this street food: {dish}
+
+Tell me a fascinating story about:
+1. Historical origin (when and where it started)
+2. Cultural significance
+3. How it evolved over time
+4. Interesting facts most people don't know
+5. Famous places to eat this
+
+Write like an engaging food documentary narrator!""",
+    "allergens": """For: {dish}
+
+Tell me about allergens:
+1. Common allergens in this dish
+2. Is it vegetarian/vegan?
+3. Does it contain gluten?
+4. Does it contain dairy?
+5. Does it contain nuts?
+6. What to ask the vendor to confirm
+
+Important: These are based on traditional recipes — always confirm with the seller!""",
+    "pairings": """For: {dish}
+
+Suggest the perfect pairings:
+1. Best drink to have with this
+2. Best side dish or accompaniment
+3. What to eat before or after
+4. What NOT to eat with this
+5. Perfect time of day to enjoy this
+
+Make it sound delicious!""",
+    "price": """For this street food: {dish}
+
+Tell me:
+1. Typical price range in Tamil Nadu/South India (₹)
+2. What affects the price (location, quality, portion)
+3. Is ₹{price_paid} a fair price? (if 0, just give typical range)
+4. Tips for getting best value
+
+Base answer on real Indian street food prices."""
+}
+
+def prompt_version(topic):
+    """Short hash of a topic's prompt, so edited prompts invalidate old answers"""
+    return hashlib.sha1(DISH_PROMPTS[topic].encode()).hexdigest()[:12]
+
+@st.cache_resource
+def get_dish_knowledge():
+    """Process-wide memory-mapped dish knowledge store"""
+    store = {"lock": threading.Lock(), "index": {}, "mmap": None, "size": 0}
+    load_dish_knowledge(store)
+    return store
+
+def load_dish_knowledge(store):
+    """Map the knowledge file and index the newest current-version answer per (dish, topic)"""
+    if store["mmap"] is not None:
+        store["mmap"].close()
+    store["mmap"], store["index"], store["size"] = None, {}, 0
+    if not os.path.exists(DISH_KNOWLEDGE_FILE) or os.path.getsize(DISH_KNOWLEDGE_FILE) == 0:
+        return
+    with open(DISH_KNOWLEDGE_FILE, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = 0
+    while offset < len(mm):
+        end = mm.find(b"\n", offset)
+        end = len(mm) if end == -1 else end
+        parts = mm[offset:end].split(b"\t", 3)
+        if len(parts) == 4:
+            dish, topic, version = (p.decode("utf-8") for p in parts[:3])
+            if topic in DISH_PROMPTS and version == prompt_version(topic):
+                start = end - len(parts[3])
+                store["index"][(dish, topic)] = (start, end)
+        offset = end + 1
+    store["mmap"], store["size"] = mm, len(mm)
+
+def lookup_dish_knowledge(dish, topic):
+    """Stored answer for a dish topic, or None"""
+    store = get_dish_knowledge()
+    with store["lock"]:
+        if os.path.exists(DISH_KNOWLEDGE_FILE) and os.path.getsize(DISH_KNOWLEDGE_FILE) != store["size"]:
+            load_dish_knowledge(store)
+        span = store["index"].get((dish, topic))
+        if span is None:
+            return None
+        return json.loads(store["mmap"][span[0]:span[1]].decode("utf-8"))
+
+def save_dish_knowledge(dish, topic, answer):
+    """Append an answer under the current prompt version"""
+    store = get_dish_knowledge()
+    with store["lock"]:
+        with open(DISH_KNOWLEDGE_FILE, "a", encoding="utf-8") as f:
+            f.write(f"{dish}\t{topic}\t{prompt_version(topic)}\t{json.dumps(answer)}\n")
+        load_dish_knowledge(store)
+
+# Other spellings of known dishes, matched anywhere in a food context
+DISH_ALIASES = {
+    "golgappa": "Pani Puri", "gol gappa": "Pani Puri", "puchka": "Pani Puri", "panipuri": "Pani Puri",
+    "bhelpuri": "Bhel Puri", "vadapav": "Vada Pav", "pavbhaji": "Pav Bhaji", "idly": "Idli",
+    "momo": "Momos", "porotta": "Parotta", "kothu": "Kothu Parotta", "pakoda": "Pakora",
+    "ganne ka ras": "Sugarcane Juice"
+}
+# Bare base names, only when they are the whole answer: inside a description they also
+# name other things ("spring roll", "lemon chai", "aloo bhaji")
+DISH_BASE_NAMES = {
+    "dosa": "Dosa", "dosai": "Dosa", "biryani": "Biryani", "briyani": "Biryani", "puri": "Puri",
+    "poori": "Puri", "vada": "Vada", "roll": "Roll", "chai": "Masala Chai", "bhaji": "Bajji"
+}
+KNOWN_DISHES = STREET_FOODS + sorted(
+    (set(DISH_ALIASES.values()) | set(DISH_BASE_NAMES.values())) - set(STREET_FOODS))
+
+def canonical_dish(context):
+    """Known dish name for a food context: full names, then aliases, then a bare base name"""
+    lowered = context.lower()
+    def mentioned(name):
+        return re.search(rf"\b{re.escape(name.lower())}s?\b", lowered) is not None
+    matches = [d for d in STREET_FOODS if mentioned(d)]
+    if matches:
+        return max(matches, key=len)
+    aliases = [a for a in DISH_ALIASES if mentioned(a)]
+    if aliases:
+        return DISH_ALIASES[max(aliases, key=len)]
+    m = re.fullmatch(r"(?:(?:this is|it is|it's)\s+)?(?:an?\s+)?([a-z ]+?)s?[.!]?", lowered.strip())
+    return DISH_BASE_NAMES.get(m.group(1).strip()) if m else None
+
+def ask_dish_topic(topic, context, price_paid=0):
+    """Static per-dish answer from the knowledge store, generated on first use"""
+    dish = canonical_dish(context)
+    if dish is None or price_paid:
+        return ask_llama(DISH_PROMPTS[topic].format(dish=context, price_paid=price_paid))
+    answer = lookup_dish_knowledge(dish, topic)
+    if answer is None:
+        answer = ask_llama(DISH_PROMPTS[topic].format(dish=dish, price_paid=0))
+        if not answer.startswith(("Error", "⚠️")):
+            save_dish_knowledge(dish, topic, answer)
+    return answer
+
+def build_dish_knowledge(dishes=KNOWN_DISHES):
+    """Offline batch job: fill in every missing or outdated dish answer"""
+    for dish in dishes:
+        for topic in DISH_PROMPTS:
+            if lookup_dish_knowledge(dish, topic) is None:
+                print(f"Generating {topic} for {dish}...")
+                ask_dish_topic(topic, dish)
+
+# ─────────────────────────────────────────────
+# PRODUCT COMPARISON
+# ─────────────────────────────────────────────
+
+MAX_COMPARE_PRODUCTS = 5
+COMPARE_MAX_WORKERS = 4
+MAX_EXTRACTIONS = 256
+EXTRACTION_PROMPT = """Read this product label. Reply with JSON only, using null for anything not visible:
+{"name": string, "brand": string, "price": MRP in rupees as a number,
+ "quantity": net quantity as a number, "unit": "g" or "ml" or "unit",
+ "sugar_g": sugar per 100 g/ml, "fat_g": total fat per 100 g/ml,
+ "sodium_mg": sodium per 100 g/ml, "protein_g": protein per 100 g/ml,
+ "allergens": list of allergens}"""
+
+@st.cache_resource
+def get_extraction_cache():
+    """Process-wide structured extractions keyed by image hash"""
+    return {"lock": threading.Lock(), "items": OrderedDict()}
+
+def extract_product_facts(image):
+    """Structured label facts from LLaVA JSON output, with OCR price/quantity when confident"""
+    try:
+        raw = json.loads(ask_llava(image, EXTRACTION_PROMPT, json_mode=True))
+    except ValueError:
+        raw = {}
+    raw = raw if isinstance(raw, dict) else {}
+    allergens = raw.get("allergens") or []
+    if isinstance(allergens, str):
+        allergens = allergens.split(",")
+    facts = {
+        "name": str(raw.get("name") or "Unknown product"),
+        "brand": str(raw.get("brand") or ""),
+        "price": to_number(raw.get("price")),
+        "quantity": to_number(raw.get("quantity")),
+        "unit": str(raw.get("unit") or "").strip().lower() or None,
+        "sugar_g": to_number(raw.get("sugar_g")),
+        "fat_g": to_number(raw.get("fat_g")),
+        "sodium_mg": to_number(raw.get("sodium_mg")),
+        "protein_g": to_number(raw.get("protein_g")),
+        "allergens": [str(a).strip() for a in allergens if str(a).strip()],
+        "extracted": bool(raw)
+    }
+    if facts["unit"] and facts["unit"].upper() in UNIT_FACTORS and facts["quantity"]:
+        factor, facts["unit"] = UNIT_FACTORS[facts["unit"].upper()]
+        facts["quantity"] *= factor
+    label = read_label(image)
+    if label["confidence"] >= OCR_CONFIDENCE_THRESHOLD:
+        facts["price"] = label["mrp"] or facts["price"]
+        if label["quantity"]:
+            facts["quantity"], facts["unit"] = label["quantity"], label["unit"]
+    return facts
+
+def extract_products(images):
+    """Extract every (key, image) pair, reusing cached results and running misses in parallel"""
+    cache = get_extraction_cache()
+    with cache["lock"]:
+        results = {key: cache["items"][key] for key, _ in images if key in cache["items"]}
+    misses = [(key, image) for key, image in images if key not in results]
+    if misses:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(misses), COMPARE_MAX_WORKERS)) as pool:
+            extracted = list(pool.map(lambda item: extract_product_facts(item[1]), misses))
+        with cache["lock"]:
+            for (key, _), facts in zip(misses, extracted):
+                results[key] = facts
+                if facts["extracted"]:
+                    cache["items"][key] = facts
+            while len(cache["items"]) > MAX_EXTRACTIONS:
+                cache["items"].popitem(last=False)
+    return [results[key] for key, _ in images]
+
+def rank_ascending(values):
+    """1-based ranks, smallest first, missing values last"""
+    order = np.argsort(np.where(np.isnan(values), np.inf, values), kind="stable")
+    ranks = np.empty(len(values), dtype=int)
+    ranks[order] = np.arange(1, len(values) + 1)
+    return ranks
+
+def comparison_table(products):
+    """Price per 100 g/ml, health score and overall rank for each product, best first"""
+    def column(field):
+        return np.array([np.nan if p[field] is None else p[field] for p in products], dtype=float)
+    price, quantity = column("price"), column("quantity")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_100 = np.where(quantity > 0, price / quantity * 100, np.nan)
+    # ₹ per 100 g and per 100 ml are different numbers: only the most common of the two is
+    # ranked, everything else (other unit, "unit" packs, no unit) shows n/a
+    units = [p["unit"] if p["unit"] in ("g", "ml") and not np.isnan(per_100[i]) else None
+             for i, p in enumerate(products)]
+    counted = [u for u in units if u]
+    compare_unit = max(counted, key=counted.count) if counted else None
+    per_100[[u != compare_unit or u is None for u in units]] = np.nan
+    nutrients = [column(f) for f in ("sugar_g", "fat_g", "sodium_mg", "protein_g")]
+    sugar, fat, sodium, protein = (np.nan_to_num(n) for n in nutrients)
+    # Per 100 g/ml: start at 10, penalise sugar, fat and sodium, reward protein
+    health = np.clip(10 - sugar / 5 - fat / 5 - sodium / 200 + protein / 5, 0, 10)
+    # No nutrition read at all is unknown, not a perfect 10 — rank it last like a missing price
+    health[np.all(np.isnan(nutrients), axis=0)] = np.nan
+    value_rank = rank_ascending(per_100)
+    health_rank = rank_ascending(-health)
+    overall = rank_ascending((value_rank + health_rank).astype(float))
+    rows = []
+    for i, p in enumerate(products):
+        rows.append({
+            "Rank": int(overall[i]),
+            "Product": f"{p['brand']} {p['name']}".strip(),
+            "Price (₹)": p["price"],
+            "Quantity": f"{p['quantity']:g} {p['unit']}" if p["quantity"] else None,
+            "₹ per 100": None if np.isnan(per_100[i]) else round(float(per_100[i]), 2),
+            "Health /10": "n/a" if np.isnan(health[i]) else f"{health[i]:.1f}",
+            "Value rank": int(value_rank[i]),
+            "Health rank": int(health_rank[i]),
+            "Allergens": ", ".join(p["allergens"]) or "None listed"
+        })
+    return sorted(rows, key=lambda r: r["Rank"])
+
+def summarise_comparison(rows):
+    """One LLM call over the structured comparison table"""
+    table = "\n".join(
+        f"{r['Rank']}. {r['Product']} — price ₹{r['Price (₹)'] or 'n/a'}, quantity {r['Quantity'] or 'n/a'}, "
+        f"₹{r['₹ per 100'] or 'n/a'} per 100 g/ml, "
+        f"health {r['Health /10'] if r['Health /10'] == 'n/a' else r['Health /10'] + '/10'}, allergens: {r['Allergens']}"
+        for r in rows
+    )
+    return ask_llama(f"""Products compared on the shelf (ranked by value and health):
+{table}
+
+Tell me:
+1. Best overall pick and why
+2. Best value for money
+3. Healthiest option
+4. Any allergen warnings
+
+Be concise — under 150 words.""")
+
+# ─────────────────────────────────────────────
+# SCAN INDEX
+# ─────────────────────────────────────────────
+
+# Images whose 64-bit pHashes differ in at most this many bits are the same product
+PHASH_THRESHOLD = 8
+MAX_SCANS = 200
+
+def phash(image):
+    """64-bit DCT perceptual hash of an image"""
+    gray = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+def get_scan_index():
+    """BK-tree over this session's saved scans, built on first use"""
+    if "scan_index" not in st.session_state:
+        tree = {"root": None}
+        for scan in get_data().setdefault("scans", []):
+            bk_insert(tree, int(scan["phash"], 16), scan)
+        st.session_state.scan_index = tree
+    return st.session_state.scan_index
+
+def find_scan(image, create=False):
+    """Nearest earlier scan of the same product, optionally recording a new one"""
+    key = phash(image)
+    matches = bk_search(get_scan_index(), key, PHASH_THRESHOLD)
+    if matches:
+        return matches[0][1]
+    if not create:
+        return None
+    scan = {"phash": f"{key:016x}", "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+            "facts": None, "analyses": {}}
+    scans = get_data().setdefault("scans", [])
+    scans.append(scan)
+    if len(scans) > MAX_SCANS:
+        del scans[:-MAX_SCANS]
+        st.session_state.pop("scan_index", None)
+    else:
+        bk_insert(get_scan_index(), key, scan)
+    return scan
+
+def remembered_answer(image, action):
+    """Counts the click, then returns an earlier or prefetched answer, or None"""
+    record_click(action)
+    scan = find_scan(image)
+    if scan is not None and action in scan["analyses"]:
+        st.caption(f"♻️ Same product as your scan on {scan['timestamp']} — showing that answer")
+        return scan["analyses"][action]
+    result = take_prefetched(image, action)
+    if result is not None:
+        st.caption("⚡ Prepared in the background while you were reading")
+        remember_answer(image, action, result)
+    return result
+
+def remember_answer(image, action, result):
+    """Store a Quick Action answer with this product's scan"""
+    if result.startswith(("Error", "⚠️")):
+        return
+    mark_answered(image, action)
+    find_scan(image, create=True)["analyses"][action] = result
+    save_data(get_data())
+
+def extract_scanned_products(products):
+    """Extractions for (key, image) pairs, reusing facts saved with earlier scans"""
+    scans = [find_scan(image, create=True) for _, image in products]
+    missing = [(item, scan) for item, scan in zip(products, scans) if not scan["facts"]]
+    if missing:
+        for (_, scan), facts in zip(missing, extract_products([item for item, _ in missing])):
+            if facts["extracted"]:
+                scan["facts"] = facts
+        save_data(get_data())
+    return [scan["facts"] or facts_placeholder() for scan in scans]
+
+def facts_placeholder():
+    """Empty extraction for a label that could not be read"""
+    return {"name": "Unknown product", "brand": "", "price": None, "quantity": None, "unit": None,
+            "sugar_g": None, "fat_g": None, "sodium_mg": None, "protein_g": None,
+            "allergens": [], "extracted": False}
+
+# ─────────────────────────────────────────────
+# EXPENSE LEDGER
+# ─────────────────────────────────────────────
+
+EXPENSE_CATEGORIES = ["Groceries", "Vegetables", "Fruits", "Dairy", "Snacks",
+                      "Street Food", "Household", "Other"]
+
+# ─────────────────────────────────────────────
+# SPECULATIVE PREFETCH
+# ─────────────────────────────────────────────
+
+# Quick Actions worth running before they are clicked (not Expiry: it depends on today)
+PREFETCHABLE_ACTIONS = ["worth_buying", "health_score", "allergens", "price_per_unit", "alternatives"]
+PREFETCH_TOP_ACTIONS = 2
+MAX_PREFETCHED = 200
+PREFETCH_JOIN_SECONDS = 90
+# One LLaVA description covering everything the two-hop prefetchable actions need
+PREFETCH_VISION_QUESTION = ("Describe this product in detail including name, brand, price and weight if visible, "
+                            "ingredients, nutritional information and any allergen warnings on the label.")
+
+@st.cache_resource
+def get_prefetcher():
+    """Process-wide prefetch state: job queue, per-session results and interactive request count"""
+    prefetcher = {
+        "lock": threading.Lock(),
+        "queue": queue.Queue(),
+        "jobs": {},
+        "results": OrderedDict(),
+        "interactive": 0,
+        "idle": threading.Event(),
+        "local": threading.local(),
+        "worker": None
+    }
+    prefetcher["idle"].set()
+    return prefetcher
+
+def start_prefetch_worker(prefetcher):
+    """Start the background worker the first time any session turns prefetch on"""
+    with prefetcher["lock"]:
+        if prefetcher["worker"] is None:
+            prefetcher["worker"] = threading.Thread(target=run_prefetch_worker, args=(prefetcher,), daemon=True)
+            prefetcher["worker"].start()
+
+def begin_interactive(prefetcher):
+    """Mark a user-facing model request as running, pausing prefetch"""
+    with prefetcher["lock"]:
+        prefetcher["interactive"] += 1
+        prefetcher["idle"].clear()
+
+def end_interactive(prefetcher):
+    """Mark a user-facing model request as finished"""
+    with prefetcher["lock"]:
+        prefetcher["interactive"] -= 1
+        if prefetcher["interactive"] == 0:
+            prefetcher["idle"].set()
+
+def must_yield(prefetcher, job):
+    """True while interactive requests run, unless a user is already waiting on this step"""
+    return not prefetcher["idle"].is_set() and (job["urgent"] is None or job["urgent"] != job["running"])
+
+def wait_until_idle(prefetcher, job):
+    """Hold a prefetch step while it must yield, False if cancelled"""
+    while not job["cancel"].is_set():
+        if not must_yield(prefetcher, job):
+            return True
+        prefetcher["idle"].wait(timeout=0.5)
+    return False
+
+def run_prefetch_worker(prefetcher):
+    """Run queued prefetch jobs one step at a time, yielding to interactive requests"""
+    prefetcher["local"].background = True
+    while True:
+        job = prefetcher["queue"].get()
+        for action, step in job["steps"]:
+            if not wait_until_idle(prefetcher, job):
+                break
+            job["running"] = action
+            try:
+                step()
+            except Exception:
+                pass
+            finally:
+                job["running"] = None
+        job["done"].set()
+
+def store_prefetched(prefetcher, job, action, result):
+    """Keep a prefetched answer until the same session clicks for it"""
+    if result.startswith(("Error", "⚠️")):
+        return
+    with prefetcher["lock"]:
+        prefetcher["results"][(job["session"], job["key"], action)] = result
+        while len(prefetcher["results"]) > MAX_PREFETCHED:
+            prefetcher["results"].popitem(last=False)
+
+def prefetch_generate(prefetcher, job, payload):
+    """Stream a background generation, dropping it as soon as the user needs the model; None if cancelled"""
+    payload = {**payload, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE}
+    while wait_until_idle(prefetcher, job):
+        response = post_to_ollama("/api/generate", payload, timeout=60, stream=True)
+        with response:
+            if response.status_code != 200:
+                return None
+            parts = []
+            for line in response.iter_lines():
+                if job["cancel"].is_set():
+                    return None
+                if must_yield(prefetcher, job):
+                    # Closing the stream makes Ollama stop generating; start over once idle
+                    break
+                if line:
+                    chunk = json.loads(line)
+                    parts.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        return "".join(parts)
+            else:
+                return None
+    return None
+
+def prefetch_action(prefetcher, job, action, image, one_hop):
+    """Compute one Quick Action answer, sharing one vision description across the job"""
+    if action in job["answered"]:
+        return
+    result = price_per_unit_answer(read_label(image)) if action == "price_per_unit" else None
+    if result is None:
+        vision_question, build_prompt = PRODUCT_ACTIONS[action]
+        if "image" not in job:
+            job["image"] = image_to_base64(image)
+        if action in one_hop:
+            result = prefetch_generate(prefetcher, job, {"model": VISION_MODEL, "images": [job["image"]],
+                                                         "prompt": build_prompt("the item shown in this image")})
+        else:
+            if job.get("vision") is None:
+                job["vision"] = prefetch_generate(prefetcher, job, {"model": VISION_MODEL, "images": [job["image"]],
+                                                                    "prompt": PREFETCH_VISION_QUESTION})
+            if job["vision"] is None or action in job["answered"]:
+                return
+            result = prefetch_generate(prefetcher, job, {"model": TEXT_MODEL, "prompt": build_prompt(job["vision"])})
+    if result is not None and action not in job["answered"]:
+        store_prefetched(prefetcher, job, action, result)
+
+def record_click(action):
+    """Count a Quick Action click for prefetch ranking"""
+    clicks = get_data().setdefault("clicks", {})
+    clicks[action] = clicks.get(action, 0) + 1
+
+def top_actions(count=PREFETCH_TOP_ACTIONS, exclude=()):
+    """Most-clicked prefetchable actions not in exclude, ties in default order"""
+    clicks = get_data().get("clicks", {})
+    ranked = sorted(PREFETCHABLE_ACTIONS, key=lambda a: -clicks.get(a, 0))
+    return [a for a in ranked if a not in exclude][:count]
+
+def schedule_prefetch(image):
+    """Queue the likeliest analyses not yet answered for a newly scanned product"""
+    prefetcher = get_prefetcher()
+    start_prefetch_worker(prefetcher)
+    session = get_session_id()
+    key = f"{phash(image):016x}"
+    with prefetcher["lock"]:
+        current = prefetcher["jobs"].get(session)
+        if current and current["key"] == key:
+            return
+        if current:
+            current["cancel"].set()
+    # Scans live in session state, so work out what is already answered here, not in the worker
+    scan = find_scan(image)
+    answered = set(scan["analyses"]) if scan else set()
+    image = image.copy()
+    one_hop = list(st.session_state.one_hop_actions)
+    job = {"session": session, "key": key, "cancel": threading.Event(), "done": threading.Event(), "running": None,
+           "urgent": None, "answered": answered}
+    job["steps"] = [(a, lambda a=a: prefetch_action(prefetcher, job, a, image, one_hop))
+                    for a in top_actions(exclude=answered)]
+    with prefetcher["lock"]:
+        prefetcher["jobs"][session] = job
+    prefetcher["queue"].put(job)
+
+def mark_answered(image, action):
+    """Stop prefetching an action the user has just had answered"""
+    job = get_prefetcher()["jobs"].get(get_session_id())
+    if job and job["key"] == f"{phash(image):016x}":
+        job["answered"].add(action)
+
+def cancel_prefetch(session=None):
+    """Stop a session's pending prefetch job and drop its unclaimed answers"""
+    prefetcher = get_prefetcher()
+    session = session or get_session_id()
+    with prefetcher["lock"]:
+        job = prefetcher["jobs"].pop(session, None)
+        for result_key in [k for k in prefetcher["results"] if k[0] == session]:
+            del prefetcher["results"][result_key]
+    if job:
+        job["cancel"].set()
+
+def take_prefetched(image, action):
+    """Prefetched answer for this image, waiting if it is being computed right now"""
+    prefetcher = get_prefetcher()
+    session = get_session_id()
+    key = f"{phash(image):016x}"
+    job = prefetcher["jobs"].get(session)
+    if job and job["key"] == key and job["running"] == action:
+        # The user is now waiting on this step: it stops yielding to other sessions' requests
+        job["urgent"] = action
+        deadline = time.time() + PREFETCH_JOIN_SECONDS
+        while job["running"] == action and time.time() < deadline:
+            time.sleep(0.2)
+        job["urgent"] = None
+    with prefetcher["lock"]:
+        return prefetcher["results"].pop((session, key, action), None)
+
+# ─────────────────────────────────────────────
+# SESSION MEMORY
+# ─────────────────────────────────────────────
+
+@st.cache_resource
+def get_session_registry():
+    """Process-wide store of per-session images and temp files"""
+    return {"lock": threading.Lock(), "sessions": {}}
+
+def get_session_id():
+    """Id of the Streamlit session running this script"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
+def get_session_memory():
+    """Images and temp files owned by the current session"""
+    registry = get_session_registry()
+    with registry["lock"]:
+        memory = registry["sessions"].setdefault(get_session_id(), {
+            "images": OrderedDict(),
+            "temp_files": [],
+            "last_seen": time.time()
+        })
+        memory["last_seen"] = time.time()
+        return memory
+
+def release_session_memory(memory):
+    """Delete a session's temp files and drop its images"""
+    for path in memory["temp_files"]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    memory["temp_files"].clear()
+    memory["images"].clear()
+
+def evict_idle_sessions():
+    """Free memory of sessions idle for longer than SESSION_IDLE_SECONDS"""
+    registry = get_session_registry()
+    cutoff = time.time() - SESSION_IDLE_SECONDS
+    with registry["lock"]:
+        idle = [sid for sid, m in registry["sessions"].items() if m["last_seen"] < cutoff]
+        for sid in idle:
+            release_session_memory(registry["sessions"].pop(sid))
+    for sid in idle:
+        cancel_prefetch(sid)
+    return len(idle)
+
+def track_temp_file(path):
+    """Register a temp file to be deleted when the session is evicted"""
+    get_session_memory()["temp_files"].append(path)
+
+def upload_key(upload):
+    """Content hash identifying an uploaded file"""
+    return hashlib.sha1(upload.getvalue()).hexdigest()
+
+def load_image(upload):
+    """Open an uploaded image, stored once per session as downscaled JPEG bytes"""
+    raw = upload.getvalue()
+    key = upload_key(upload)
+    images = get_session_memory()["images"]
+    if key in images:
+        images.move_to_end(key)
+    else:
+        img = Image.open(io.BytesIO(raw)).convert("RGB")
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        images[key] = buffer.getvalue()
+        while len(images) > MAX_SESSION_IMAGES:
+            images.popitem(last=False)
+    return Image.open(io.BytesIO(images[key]))
+
+def add_chat_message(message):
+    """Append to chat history, keeping only the last MAX_CHAT_HISTORY messages"""
+    st.session_state.chat_history.append(message)
+    del st.session_state.chat_history[:-MAX_CHAT_HISTORY]
+
+def session_memory_report():
+    """Approximate memory held by the current session"""
+    memory = get_session_memory()
+    return {
+        "images": len(memory["images"]),
+        "image_kb": round(sum(len(b) for b in memory["images"].values()) / 1024, 1),
+        "temp_files": len(memory["temp_files"]),
+        "temp_kb": round(sum(os.path.getsize(p) for p in memory["temp_files"] if os.path.exists(p)) / 1024, 1),
+        "chat_messages": len(st.session_state.chat_history),
+        "conversations": len(st.session_state.get("llm_conversations", {}))
+    }
+
+# Offline batch job: python app.py --build-dish-knowledge
+if "--build-dish-knowledge" in sys.argv:
+    build_dish_knowledge()
+    sys.exit(0)
+
 # ─────────────────────────────────────────────
 # SESSION STATE
 # ─────────────────────────────────────────────
@@ -304,8 +1439,11 @@ if "current_product_context" not in st.session_state:
     st.session_state.current_product_context = ""
 if "current_food_context" not in st.session_state:
     st.session_state.current_food_context = ""
-if "data" not in st.session_state:
-    st.session_state.data = load_data()
+if "one_hop_actions" not in st.session_state:
+    st.session_state.one_hop_actions = list(ONE_HOP_ACTIONS)
+
+start_model_warm_up()
+evict_idle_sessions()
 
 # ─────────────────────────────────────────────
 # HEADER
@@ -316,40 +1454,47 @@ st.markdown('<div class="sub-header">Your Complete Food Intelligence Companion 
 # ─────────────────────────────────────────────
 # SIDEBAR
 # ─────────────────────────────────────────────
+def render_quick_stats():
+    """Draw the sidebar counters into their placeholder, also from inside a fragment"""
+    # A fragment may replace an st.empty drawn outside it without a full rerun
+    with stats_slot.container():
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-number">{len(get_data()['history'])}</div>
+                <div style="color:#8892b0;font-size:12px">Scans Done</div>
+            </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-number">{len(get_data()['wishlist'])}</div>
+                <div style="color:#8892b0;font-size:12px">Wishlist</div>
+            </div>
+            """, unsafe_allow_html=True)
+
 with st.sidebar:
     st.markdown("### 🎯 Navigation")
     st.markdown("---")
 
     st.markdown("### 📊 Quick Stats")
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-number">{len(st.session_state.data['history'])}</div>
-            <div style="color:#8892b0;font-size:12px">Scans Done</div>
-        </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-number">{len(st.session_state.data['wishlist'])}</div>
-            <div style="color:#8892b0;font-size:12px">Wishlist</div>
-        </div>
-        """, unsafe_allow_html=True)
+    stats_slot = st.empty()
+    render_quick_stats()
 
     st.markdown("---")
     st.markdown("### 💰 Monthly Budget")
     budget_limit = st.number_input(
         "Set Budget (₹)",
         min_value=0,
-        value=int(st.session_state.data["budget"]["monthly_limit"]),
+        value=int(get_data()["budget"]["monthly_limit"]),
         step=500
     )
-    if budget_limit != st.session_state.data["budget"]["monthly_limit"]:
-        st.session_state.data["budget"]["monthly_limit"] = budget_limit
-        save_data(st.session_state.data)
+    if budget_limit != get_data()["budget"]["monthly_limit"]:
+        get_data()["budget"]["monthly_limit"] = budget_limit
+        save_data(get_data())
 
-    spent = st.session_state.data["budget"]["spent"]
+    spent = month_spent(get_ledger(get_data()))
     if budget_limit > 0:
         progress = min(spent / budget_limit, 1.0)
         st.progress(progress)
@@ -361,6 +1506,44 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### ⚙️ Settings")
     voice_enabled = st.toggle("🔊 Voice Output", value=True)
+    prefetch_enabled = st.toggle("⚡ Prefetch Analyses", value=False,
+                                 help="Start likely Quick Actions in the background as soon as a product is scanned")
+    if not prefetch_enabled:
+        cancel_prefetch()
+    st.multiselect(
+        "⚡ One-hop actions (single vision call)",
+        options=list(VISION_ACTIONS),
+        format_func=lambda a: VISION_ACTIONS[a],
+        key="one_hop_actions"
+    )
+    if st.button("🩺 Check Models"):
+        for health in check_ollama_health():
+            st.markdown(f"`{health['url']}` — {health['in_flight']} in flight")
+            if not health["ok"]:
+                st.error(health["error"])
+            for m in health["models"]:
+                status = "🟢 loaded" if m["loaded"] else "⚪ not loaded"
+                st.markdown(f"**{m['name']}** — {status}")
+                if m["loaded"]:
+                    st.caption(f"Memory: {m['size_gb']} GB (VRAM {m['vram_gb']} GB)")
+    with st.expander("⏱️ Startup Profile"):
+        profile = get_startup_profile()
+        st.markdown(f"Process up: {int(time.time() - profile['process_start'])} s")
+        if profile["first_run_seconds"] is not None:
+            st.markdown(f"First script run: {profile['first_run_seconds']:.2f} s")
+        for name, seconds in sorted(profile["imports"].items(), key=lambda kv: -kv[1]):
+            st.markdown(f"`{name}` — {seconds * 1000:.0f} ms")
+    with st.expander("🧠 Session Memory"):
+        report = session_memory_report()
+        st.markdown(f"Images: {report['images']} ({report['image_kb']} KB)")
+        st.markdown(f"Temp audio: {report['temp_files']} ({report['temp_kb']} KB)")
+        st.markdown(f"Chat messages: {report['chat_messages']} / {MAX_CHAT_HISTORY}")
+        st.markdown(f"Follow-up conversations: {report['conversations']}")
+        if st.button("🧹 Free Session Memory"):
+            release_session_memory(get_session_memory())
+            st.session_state.chat_history = []
+            st.session_state.pop("llm_conversations", None)
+            st.rerun()
     st.markdown("---")
     st.markdown("### 🏷️ Features")
     features = ["📷 Label Scanner", "📦 Barcode Reader", "✍️ List Scanner",
@@ -372,21 +1555,167 @@ with st.sidebar:
     for f in features:
         st.markdown(f'<span class="badge">{f}</span>', unsafe_allow_html=True)
 
-# ─────────────────────────────────────────────
-# MAIN TABS
-# ─────────────────────────────────────────────
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "🛒 Shopping Mode",
-    "🍜 Street Food Mode",
-    "🎤 Voice Assistant",
-    "📊 My Tracker",
-    "📋 Shopping History"
-])
-
 # ═══════════════════════════════════════════════
 # TAB 1 — SHOPPING MODE
 # ═══════════════════════════════════════════════
-with tab1:
+@fragment
+def barcode_panel(image):
+    """Barcode scanner for the scanned product"""
+    # Barcode scanning
+    st.markdown("#### 📦 Barcode Scanner")
+    if st.button("🔍 Scan Barcode"):
+        with st.spinner("Scanning barcode..."):
+            barcode_result = scan_barcode(image)
+            st.markdown(f"""
+            <div class="result-box">
+            <b>📦 Barcode Result:</b><br>{barcode_result}
+            </div>
+            """, unsafe_allow_html=True)
+
+@fragment
+def product_actions_panel(image):
+    """Quick Actions, free Q&A and wishlist for the scanned product"""
+    # Quick action buttons
+    st.markdown("#### ⚡ Quick Actions")
+    quick_col1, quick_col2 = st.columns(2)
+
+    with quick_col1:
+        if st.button("💡 Worth Buying?"):
+            with st.spinner("Analysing..."):
+                result = remembered_answer(image, "worth_buying")
+                if result is None:
+                    vision, result = ask_vision_action("worth_buying", image, *PRODUCT_ACTIONS["worth_buying"])
+                    st.session_state.current_product_context = vision
+                    add_chat_message({"role": "assistant", "content": result, "type": "shopping"})
+                    remember_answer(image, "worth_buying", result)
+                else:
+                    st.session_state.current_product_context = result
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("❤️ Health Score"):
+            with st.spinner("Checking health score..."):
+                result = remembered_answer(image, "health_score")
+                if result is None:
+                    _, result = ask_vision_action("health_score", image, *PRODUCT_ACTIONS["health_score"])
+                    remember_answer(image, "health_score", result)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("📅 Expiry Check"):
+            with st.spinner("Checking expiry..."):
+                result = expiry_answer(read_label(image))
+                if result is None:
+                    _, result = ask_vision_action("expiry", image, *PRODUCT_ACTIONS["expiry"])
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+    with quick_col2:
+        if st.button("⚖️ Compare Products"):
+            st.info(f"Upload 2–{MAX_COMPARE_PRODUCTS} product images in Compare Products below")
+
+        if st.button("🌿 Allergens"):
+            with st.spinner("Checking allergens..."):
+                result = remembered_answer(image, "allergens")
+                if result is None:
+                    _, result = ask_vision_action("allergens", image, *PRODUCT_ACTIONS["allergens"])
+                    remember_answer(image, "allergens", result)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("💰 Price Per Unit"):
+            with st.spinner("Calculating..."):
+                result = remembered_answer(image, "price_per_unit")
+                if result is None:
+                    result = price_per_unit_answer(read_label(image))
+                    if result is None:
+                        _, result = ask_vision_action("price_per_unit", image, *PRODUCT_ACTIONS["price_per_unit"])
+                    remember_answer(image, "price_per_unit", result)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("🔄 Alternatives"):
+            with st.spinner("Finding alternatives..."):
+                result = remembered_answer(image, "alternatives")
+                if result is None:
+                    _, result = ask_vision_action("alternatives", image, *PRODUCT_ACTIONS["alternatives"])
+                    remember_answer(image, "alternatives", result)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+    # Free Q&A
+    st.markdown("---")
+    st.markdown("#### 💬 Ask Anything About This Product")
+    user_question = st.text_input("Type your question...", placeholder="Is this safe for diabetics?")
+    if st.button("🚀 Ask") and user_question:
+        with st.spinner("Thinking..."):
+            if not st.session_state.current_product_context:
+                st.session_state.current_product_context = ask_llava(image, "Describe this product completely.")
+            product = st.session_state.current_product_context
+            result = ask_followup(
+                "product", product,
+                f"""Product context: {product}
+
+User question: {user_question}
+
+Answer helpfully and honestly.""",
+                f"""User question about the same product: {user_question}
+
+Answer helpfully and honestly."""
+            )
+
+            # Save to history
+            get_data()["history"].append({
+                "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                "type": "Shopping",
+                "question": user_question,
+                "answer": result[:200] + "...",
+                "scan": find_scan(image, create=True)["phash"]
+            })
+            save_data(get_data())
+            render_quick_stats()
+            st.markdown(f'<div class="result-box"><b>Q: {user_question}</b><br><br>{result}</div>', unsafe_allow_html=True)
+
+    # Add to wishlist
+    st.markdown("---")
+    wishlist_name = st.text_input("Product name for wishlist")
+    if st.button("❤️ Add to Wishlist") and wishlist_name:
+        get_data()["wishlist"].append({
+            "name": wishlist_name,
+            "added": datetime.now().strftime("%d/%m/%Y")
+        })
+        save_data(get_data())
+        render_quick_stats()
+        st.success(f"✅ {wishlist_name} added to wishlist!")
+
+@fragment
+def shopping_list_panel(list_img):
+    """Reads a handwritten shopping list"""
+    if st.button("📋 Read My List"):
+        with st.spinner("Reading your handwritten list..."):
+            _, final = ask_vision_action(
+                "shopping_list", list_img,
+                "Read this handwritten shopping list carefully. List every item you can see written on it.",
+                lambda result: f"""Shopping list items: {result}
+
+For each item:
+1. Confirm the item name
+2. Suggest what to look for when buying
+3. Estimated price range in India (₹)
+4. Any buying tips
+
+Format clearly."""
+            )
+            st.markdown(f'<div class="result-box">{final}</div>', unsafe_allow_html=True)
+
+
+@fragment
+def compare_panel(products):
+    """Side-by-side comparison of the uploaded products"""
+    if st.button("⚖️ Compare"):
+        with st.spinner(f"Reading {len(products)} labels..."):
+            rows = comparison_table(extract_scanned_products(products))
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        with st.spinner("Summarising..."):
+            summary = summarise_comparison(rows)
+        st.markdown(f'<div class="result-box">{summary}</div>', unsafe_allow_html=True)
+
+def render_shopping_tab(prefetch_enabled):
+    """Shopping Mode tab"""
     st.markdown("## 🛒 Shopping Assistant")
     st.markdown("Point your camera at any product — ask anything!")
 
@@ -404,166 +1733,24 @@ with tab1:
         if scan_method == "📸 Camera":
             camera_image = st.camera_input("Point at product")
             if camera_image:
-                image = Image.open(camera_image)
+                image = load_image(camera_image)
         else:
             uploaded = st.file_uploader("Upload product image", type=["jpg", "jpeg", "png"])
             if uploaded:
-                image = Image.open(uploaded)
+                image = load_image(uploaded)
 
         if image:
+            if prefetch_enabled:
+                schedule_prefetch(image)
             st.image(image, caption="Scanned Product", use_container_width=True)
 
-            # Barcode scanning
-            st.markdown("#### 📦 Barcode Scanner")
-            if st.button("🔍 Scan Barcode"):
-                with st.spinner("Scanning barcode..."):
-                    barcode_result = scan_barcode(image)
-                    st.markdown(f"""
-                    <div class="result-box">
-                    <b>📦 Barcode Result:</b><br>{barcode_result}
-                    </div>
-                    """, unsafe_allow_html=True)
+            barcode_panel(image)
 
     with col2:
         st.markdown("### 🤖 Ask About This Product")
 
         if image:
-            # Quick action buttons
-            st.markdown("#### ⚡ Quick Actions")
-            quick_col1, quick_col2 = st.columns(2)
-
-            with quick_col1:
-                if st.button("💡 Worth Buying?"):
-                    with st.spinner("Analysing..."):
-                        vision = ask_llava(image, "Describe this product in detail including name, brand, price if visible, ingredients, and any other details you can see on the label.")
-                        st.session_state.current_product_context = vision
-                        prompt = f"""Based on this product: {vision}
-
-Tell me:
-1. What is this product?
-2. Is it worth buying? (value for money)
-3. Pros and cons
-4. Overall verdict (Buy / Skip / Maybe)
-
-Be honest and concise."""
-                        result = ask_llama(prompt)
-                        st.session_state.chat_history.append({"role": "assistant", "content": result, "type": "shopping"})
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("❤️ Health Score"):
-                    with st.spinner("Checking health score..."):
-                        vision = ask_llava(image, "Read all ingredients, nutritional information, sugar content, sodium, fats from this product label.")
-                        prompt = f"""Based on this product: {vision}
-
-Give me:
-1. Health score out of 10
-2. Main health concerns
-3. Who should avoid this
-4. Healthier alternatives
-
-Be direct and honest."""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("📅 Expiry Check"):
-                    with st.spinner("Checking expiry..."):
-                        vision = ask_llava(image, "Find and read the expiry date, best before date, or manufacturing date on this product.")
-                        prompt = f"""Based on: {vision}
-
-Tell me:
-1. Expiry/best before date
-2. Is it safe to buy/consume now?
-3. How long until expiry
-4. Storage advice
-
-Today's date: {datetime.now().strftime('%d %B %Y')}"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-            with quick_col2:
-                if st.button("⚖️ Compare Products"):
-                    st.info("Upload a second product image below to compare")
-
-                if st.button("🌿 Allergens"):
-                    with st.spinner("Checking allergens..."):
-                        vision = ask_llava(image, "Read all ingredients and allergen warnings from this product label.")
-                        prompt = f"""Based on: {vision}
-
-List:
-1. All allergens present
-2. May contain warnings
-3. Safe for: vegetarians/vegans/gluten-free/diabetics
-4. Hidden allergens to watch out for"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("💰 Price Per Unit"):
-                    with st.spinner("Calculating..."):
-                        vision = ask_llava(image, "Read the price, weight/volume/quantity from this product.")
-                        prompt = f"""Based on: {vision}
-
-Calculate:
-1. Price per gram/ml/unit
-2. Is this good value compared to typical market prices?
-3. Better value size/brand recommendations"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("🔄 Alternatives"):
-                    with st.spinner("Finding alternatives..."):
-                        vision = ask_llava(image, "What product is this? Brand, type, price if visible.")
-                        prompt = f"""Based on: {vision}
-
-Suggest:
-1. 3 cheaper alternatives
-2. 3 healthier alternatives  
-3. Best overall alternative and why"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-            # Free Q&A
-            st.markdown("---")
-            st.markdown("#### 💬 Ask Anything About This Product")
-            user_question = st.text_input("Type your question...", placeholder="Is this safe for diabetics?")
-            if st.button("🚀 Ask") and user_question:
-                with st.spinner("Thinking..."):
-                    if st.session_state.current_product_context:
-                        prompt = f"""Product context: {st.session_state.current_product_context}
-
-User question: {user_question}
-
-Answer helpfully and honestly."""
-                    else:
-                        vision = ask_llava(image, "Describe this product completely.")
-                        st.session_state.current_product_context = vision
-                        prompt = f"""Product: {vision}
-
-User question: {user_question}
-
-Answer helpfully and honestly."""
-                    result = ask_llama(prompt)
-                    st.markdown(f'<div class="result-box"><b>Q: {user_question}</b><br><br>{result}</div>', unsafe_allow_html=True)
-
-                    # Save to history
-                    st.session_state.data["history"].append({
-                        "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        "type": "Shopping",
-                        "question": user_question,
-                        "answer": result[:200] + "..."
-                    })
-                    save_data(st.session_state.data)
-
-            # Add to wishlist
-            st.markdown("---")
-            wishlist_name = st.text_input("Product name for wishlist")
-            if st.button("❤️ Add to Wishlist") and wishlist_name:
-                st.session_state.data["wishlist"].append({
-                    "name": wishlist_name,
-                    "added": datetime.now().strftime("%d/%m/%Y")
-                })
-                save_data(st.session_state.data)
-                st.success(f"✅ {wishlist_name} added to wishlist!")
-
+            product_actions_panel(image)
         else:
             st.markdown("""
             <div class="feature-card">
@@ -591,29 +1778,148 @@ Answer helpfully and honestly."""
     with list_col1:
         list_image = st.file_uploader("Upload your handwritten shopping list", type=["jpg", "jpeg", "png"], key="list_upload")
         if list_image:
-            list_img = Image.open(list_image)
+            list_img = load_image(list_image)
             st.image(list_img, caption="Your Shopping List", use_container_width=True)
 
     with list_col2:
-        if list_image and st.button("📋 Read My List"):
-            with st.spinner("Reading your handwritten list..."):
-                result = ask_llava(list_img, "Read this handwritten shopping list carefully. List every item you can see written on it.")
-                prompt = f"""Shopping list items: {result}
-
-For each item:
-1. Confirm the item name
-2. Suggest what to look for when buying
-3. Estimated price range in India (₹)
-4. Any buying tips
+        if list_image:
+            shopping_list_panel(list_img)
 
-Format clearly."""
-                final = ask_llama(prompt)
-                st.markdown(f'<div class="result-box">{final}</div>', unsafe_allow_html=True)
+    # Multi-product comparison
+    st.markdown("---")
+    st.markdown("### ⚖️ Compare Products")
+    compare_uploads = st.file_uploader(
+        f"Upload 2–{MAX_COMPARE_PRODUCTS} product images",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        key="compare_upload"
+    )
+    if compare_uploads:
+        compare_uploads = compare_uploads[:MAX_COMPARE_PRODUCTS]
+        products = [(upload_key(u), load_image(u)) for u in compare_uploads]
+        thumb_cols = st.columns(len(products))
+        for col, (_, img) in zip(thumb_cols, products):
+            with col:
+                st.image(img, use_container_width=True)
+        if len(products) >= 2:
+            compare_panel(products)
 
 # ═══════════════════════════════════════════════
 # TAB 2 — STREET FOOD MODE
 # ═══════════════════════════════════════════════
-with tab2:
+@fragment
+def food_actions_panel(food_image):
+    """Quick Actions and chef Q&A for the captured food"""
+    # First scan the food
+    food_quick1, food_quick2 = st.columns(2)
+
+    with food_quick1:
+        if st.button("🍽️ What Is This?"):
+            with st.spinner("Identifying dish..."):
+                vision, result = ask_vision_action(
+                    "what_is_this", food_image,
+                    "What street food dish is this? Describe it in detail including appearance, ingredients visible, cooking method, and any other details.",
+                    lambda vision: f"""Based on this street food: {vision}
+
+Tell me:
+1. Name of the dish
+2. Region/state it belongs to
+3. Main ingredients
+4. How it's typically made
+5. Best time to eat it
+
+Be enthusiastic and informative!""",
+                    known_context=recognise_dish(food_image)
+                )
+                st.session_state.current_food_context = vision
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("📖 Dish Story"):
+            with st.spinner("Finding the story..."):
+                if not st.session_state.current_food_context:
+                    st.session_state.current_food_context = identify_dish(food_image)
+                result = ask_dish_topic("story", st.session_state.current_food_context)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("🛡️ Safety Tips"):
+            with st.spinner("Checking safety..."):
+                _, result = ask_vision_action(
+                    "safety_tips", food_image,
+                    "Describe the food stall or food preparation visible. Is the food covered? How does it look? What's the cooking environment like?",
+                    lambda vision: f"""Street food stall observation: {vision}
+
+Give me:
+1. General food safety assessment based on what's visible
+2. 3 things that look good (if any)
+3. 3 things to be cautious about (if any)
+4. Should I eat here? Overall recommendation
+5. Tips for eating street food safely
+
+Be honest but fair."""
+                )
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+    with food_quick2:
+        if st.button("🌾 Allergens Q&A"):
+            with st.spinner("Checking allergens..."):
+                if not st.session_state.current_food_context:
+                    st.session_state.current_food_context = identify_dish(food_image)
+                result = ask_dish_topic("allergens", st.session_state.current_food_context)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("🍷 Best Pairings"):
+            with st.spinner("Finding pairings..."):
+                if not st.session_state.current_food_context:
+                    st.session_state.current_food_context = identify_dish(food_image)
+                result = ask_dish_topic("pairings", st.session_state.current_food_context)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+        if st.button("💵 Fair Price?"):
+            with st.spinner("Checking price..."):
+                if not st.session_state.current_food_context:
+                    st.session_state.current_food_context = identify_dish(food_image)
+                price_paid = st.session_state.get("price_paid", 0)
+                result = ask_dish_topic("price", st.session_state.current_food_context, price_paid)
+                st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
+
+    # Price input
+    st.session_state.price_paid = st.number_input("I paid (₹)", min_value=0, step=5, key="price_input")
+
+    # Free Q&A for food
+    st.markdown("---")
+    st.markdown("#### 💬 Ask Anything About This Food")
+    food_question = st.text_input("Type your question...", placeholder="Is this spicy? Can my child eat this?", key="food_q")
+    if st.button("🚀 Ask Chef AI") and food_question:
+        with st.spinner("Asking the AI chef..."):
+            if not st.session_state.current_food_context:
+                st.session_state.current_food_context = identify_dish(food_image, "Describe this food completely.")
+            food = st.session_state.current_food_context
+            result = ask_followup(
+                "food", food,
+                f"""Street food context: {food}
+
+Question: {food_question}
+
+Answer like a knowledgeable local food expert. Be helpful and specific.""",
+                f"""Another question about the same street food: {food_question}
+
+Answer like a knowledgeable local food expert. Be helpful and specific."""
+            )
+
+            # Save to history
+            get_data()["history"].append({
+                "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                "type": "Street Food",
+                "question": food_question,
+                "answer": result[:200] + "..."
+            })
+            save_data(get_data())
+            render_quick_stats()
+            st.markdown(f'<div class="result-box"><b>Q: {food_question}</b><br><br>{result}</div>', unsafe_allow_html=True)
+
+
+def render_street_food_tab():
+    """Street Food Mode tab"""
     st.markdown("## 🍜 Street Food Judge")
     st.markdown("Point your camera at any street food — discover, understand, enjoy!")
 
@@ -632,11 +1938,11 @@ with tab2:
         if food_method == "📸 Camera":
             food_camera = st.camera_input("Point at street food", key="food_camera")
             if food_camera:
-                food_image = Image.open(food_camera)
+                food_image = load_image(food_camera)
         else:
             food_uploaded = st.file_uploader("Upload food image", type=["jpg", "jpeg", "png"], key="food_upload")
             if food_uploaded:
-                food_image = Image.open(food_uploaded)
+                food_image = load_image(food_uploaded)
 
         if food_image:
             st.image(food_image, caption="Street Food", use_container_width=True)
@@ -645,141 +1951,7 @@ with tab2:
         st.markdown("### 🤖 Food Intelligence")
 
         if food_image:
-            # First scan the food
-            food_quick1, food_quick2 = st.columns(2)
-
-            with food_quick1:
-                if st.button("🍽️ What Is This?"):
-                    with st.spinner("Identifying dish..."):
-                        vision = ask_llava(food_image, "What street food dish is this? Describe it in detail including appearance, ingredients visible, cooking method, and any other details.")
-                        st.session_state.current_food_context = vision
-                        prompt = f"""Based on this street food: {vision}
-
-Tell me:
-1. Name of the dish
-2. Region/state it belongs to
-3. Main ingredients
-4. How it's typically made
-5. Best time to eat it
-
-Be enthusiastic and informative!"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("📖 Dish Story"):
-                    with st.spinner("Finding the story..."):
-                        if not st.session_state.current_food_context:
-                            st.session_state.current_food_context = ask_llava(food_image, "What dish is this?")
-                        prompt = f"""For this street food: {st.session_state.current_food_context}
-
-Tell me a fascinating story about:
-1. Historical origin (when and where it started)
-2. Cultural significance
-3. How it evolved over time
-4. Interesting facts most people don't know
-5. Famous places to eat this
-
-Write like an engaging food documentary narrator!"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("🛡️ Safety Tips"):
-                    with st.spinner("Checking safety..."):
-                        vision = ask_llava(food_image, "Describe the food stall or food preparation visible. Is the food covered? How does it look? What's the cooking environment like?")
-                        prompt = f"""Street food stall observation: {vision}
-
-Give me:
-1. General food safety assessment based on what's visible
-2. 3 things that look good (if any)
-3. 3 things to be cautious about (if any)
-4. Should I eat here? Overall recommendation
-5. Tips for eating street food safely
-
-Be honest but fair."""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-            with food_quick2:
-                if st.button("🌾 Allergens Q&A"):
-                    with st.spinner("Checking allergens..."):
-                        if not st.session_state.current_food_context:
-                            st.session_state.current_food_context = ask_llava(food_image, "What dish is this?")
-                        prompt = f"""For: {st.session_state.current_food_context}
-
-Tell me about allergens:
-1. Common allergens in this dish
-2. Is it vegetarian/vegan?
-3. Does it contain gluten?
-4. Does it contain dairy?
-5. Does it contain nuts?
-6. What to ask the vendor to confirm
-
-Important: These are based on traditional recipes — always confirm with the seller!"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("🍷 Best Pairings"):
-                    with st.spinner("Finding pairings..."):
-                        if not st.session_state.current_food_context:
-                            st.session_state.current_food_context = ask_llava(food_image, "What dish is this?")
-                        prompt = f"""For: {st.session_state.current_food_context}
-
-Suggest the perfect pairings:
-1. Best drink to have with this
-2. Best side dish or accompaniment
-3. What to eat before or after
-4. What NOT to eat with this
-5. Perfect time of day to enjoy this
-
-Make it sound delicious!"""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-                if st.button("💵 Fair Price?"):
-                    with st.spinner("Checking price..."):
-                        if not st.session_state.current_food_context:
-                            st.session_state.current_food_context = ask_llava(food_image, "What dish is this?")
-                        price_paid = st.session_state.get("price_paid", 0)
-                        prompt = f"""For this street food: {st.session_state.current_food_context}
-
-Tell me:
-1. Typical price range in Tamil Nadu/South India (₹)
-2. What affects the price (location, quality, portion)
-3. Is ₹{price_paid} a fair price? (if 0, just give typical range)
-4. Tips for getting best value
-
-Base answer on real Indian street food prices."""
-                        result = ask_llama(prompt)
-                        st.markdown(f'<div class="result-box">{result}</div>', unsafe_allow_html=True)
-
-            # Price input
-            st.session_state.price_paid = st.number_input("I paid (₹)", min_value=0, step=5, key="price_input")
-
-            # Free Q&A for food
-            st.markdown("---")
-            st.markdown("#### 💬 Ask Anything About This Food")
-            food_question = st.text_input("Type your question...", placeholder="Is this spicy? Can my child eat this?", key="food_q")
-            if st.button("🚀 Ask Chef AI") and food_question:
-                with st.spinner("Asking the AI chef..."):
-                    if not st.session_state.current_food_context:
-                        st.session_state.current_food_context = ask_llava(food_image, "Describe this food completely.")
-                    prompt = f"""Street food context: {st.session_state.current_food_context}
-
-Question: {food_question}
-
-Answer like a knowledgeable local food expert. Be helpful and specific."""
-                    result = ask_llama(prompt)
-                    st.markdown(f'<div class="result-box"><b>Q: {food_question}</b><br><br>{result}</div>', unsafe_allow_html=True)
-
-                    # Save to history
-                    st.session_state.data["history"].append({
-                        "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        "type": "Street Food",
-                        "question": food_question,
-                        "answer": result[:200] + "..."
-                    })
-                    save_data(st.session_state.data)
-
+            food_actions_panel(food_image)
         else:
             st.markdown("""
             <div class="feature-card">
@@ -803,7 +1975,84 @@ Answer like a knowledgeable local food expert. Be helpful and specific."""
 # ═══════════════════════════════════════════════
 # TAB 3 — VOICE ASSISTANT
 # ═══════════════════════════════════════════════
-with tab3:
+@fragment
+def voice_question_panel(voice_enabled):
+    """Transcribes an uploaded voice question and answers it"""
+    audio_file = st.file_uploader("Upload audio question (WAV/MP3)", type=["wav", "mp3", "m4a"])
+
+    if audio_file and st.button("🎤 Transcribe & Answer"):
+        with st.spinner("Processing your voice..."):
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
+                f.write(audio_file.read())
+                temp_path = f.name
+
+            try:
+                transcribed = transcribe_voice(temp_path)
+            finally:
+                os.remove(temp_path)
+            st.markdown(f"""
+            <div class="success-box">
+            <b>🎤 You said:</b><br>{transcribed}
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Answer the question
+            answer = ask_llama(f"Answer this shopping or food question helpfully: {transcribed}")
+            st.markdown(f'<div class="result-box"><b>🤖 AI Answer:</b><br>{answer}</div>', unsafe_allow_html=True)
+
+            # Speak the answer
+            if voice_enabled:
+                audio_path = speak_text(answer)
+                if audio_path:
+                    st.audio(audio_path)
+
+@fragment
+def hands_free_panel(voice_enabled):
+    """Typed questions with spoken answers"""
+    st.markdown("### 💬 Hands-Free Text Mode")
+    st.markdown("Type your question — AI answers and speaks back")
+
+    hands_free_q = st.text_area("Your question", placeholder="Is Maggi healthy? What is dosa made of? Should I buy this product?", height=100)
+
+    if st.button("🚀 Get Answer + Speak"):
+        if hands_free_q:
+            with st.spinner("Thinking and speaking..."):
+                answer = ask_llama(f"""Answer this shopping or food question in a helpful, conversational way:
+
+Question: {hands_free_q}
+
+Give a clear, practical answer.""")
+                st.markdown(f'<div class="result-box">{answer}</div>', unsafe_allow_html=True)
+
+                if voice_enabled:
+                    audio_path = speak_text(answer)
+                    if audio_path:
+                        st.audio(audio_path)
+                        st.success("🔊 Answer spoken! Press play to hear it")
+
+    st.markdown("---")
+    st.markdown("### 💡 Try These Questions")
+    sample_questions = [
+        "What should I look for when buying olive oil?",
+        "Is biryani healthy to eat daily?",
+        "How do I know if an egg is fresh?",
+        "What is the best time to buy vegetables?",
+        "Is Maggi safe for children?",
+        "What does dosa taste like?"
+    ]
+    for q in sample_questions:
+        if st.button(f"💬 {q}", key=f"sample_{q}"):
+            with st.spinner("Answering..."):
+                answer = ask_llama(f"Answer this helpfully: {q}")
+                st.markdown(f'<div class="result-box">{answer}</div>', unsafe_allow_html=True)
+                if voice_enabled:
+                    audio_path = speak_text(answer)
+                    if audio_path:
+                        st.audio(audio_path)
+
+
+def render_voice_tab(voice_enabled):
+    """Voice Assistant tab"""
     st.markdown("## 🎤 Voice Assistant")
     st.markdown("Ask anything by voice — get answers spoken back to you!")
 
@@ -823,140 +2072,108 @@ with tab3:
         </div>
         """, unsafe_allow_html=True)
 
-        audio_file = st.file_uploader("Upload audio question (WAV/MP3)", type=["wav", "mp3", "m4a"])
-
-        if audio_file and st.button("🎤 Transcribe & Answer"):
-            with st.spinner("Processing your voice..."):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-                    f.write(audio_file.read())
-                    temp_path = f.name
-
-                transcribed = transcribe_voice(temp_path)
-                st.markdown(f"""
-                <div class="success-box">
-                <b>🎤 You said:</b><br>{transcribed}
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Answer the question
-                answer = ask_llama(f"Answer this shopping or food question helpfully: {transcribed}")
-                st.markdown(f'<div class="result-box"><b>🤖 AI Answer:</b><br>{answer}</div>', unsafe_allow_html=True)
-
-                # Speak the answer
-                if voice_enabled:
-                    audio_path = speak_text(answer)
-                    if audio_path:
-                        st.audio(audio_path)
+        voice_question_panel(voice_enabled)
 
     with col2:
-        st.markdown("### 💬 Hands-Free Text Mode")
-        st.markdown("Type your question — AI answers and speaks back")
-
-        hands_free_q = st.text_area("Your question", placeholder="Is Maggi healthy? What is dosa made of? Should I buy this product?", height=100)
-
-        if st.button("🚀 Get Answer + Speak"):
-            if hands_free_q:
-                with st.spinner("Thinking and speaking..."):
-                    answer = ask_llama(f"""Answer this shopping or food question in a helpful, conversational way:
-
-Question: {hands_free_q}
-
-Give a clear, practical answer.""")
-                    st.markdown(f'<div class="result-box">{answer}</div>', unsafe_allow_html=True)
-
-                    if voice_enabled:
-                        audio_path = speak_text(answer)
-                        if audio_path:
-                            st.audio(audio_path)
-                            st.success("🔊 Answer spoken! Press play to hear it")
-
-        st.markdown("---")
-        st.markdown("### 💡 Try These Questions")
-        sample_questions = [
-            "What should I look for when buying olive oil?",
-            "Is biryani healthy to eat daily?",
-            "How do I know if an egg is fresh?",
-            "What is the best time to buy vegetables?",
-            "Is Maggi safe for children?",
-            "What does dosa taste like?"
-        ]
-        for q in sample_questions:
-            if st.button(f"💬 {q}", key=f"sample_{q}"):
-                with st.spinner("Answering..."):
-                    answer = ask_llama(f"Answer this helpfully: {q}")
-                    st.markdown(f'<div class="result-box">{answer}</div>', unsafe_allow_html=True)
-                    if voice_enabled:
-                        audio_path = speak_text(answer)
-                        if audio_path:
-                            st.audio(audio_path)
+        hands_free_panel(voice_enabled)
 
 # ═══════════════════════════════════════════════
 # TAB 4 — TRACKER
 # ═══════════════════════════════════════════════
-with tab4:
+@fragment
+def budget_panel():
+    """Expense entry, this month's total and spending trends"""
+    st.markdown("### 💰 Budget Tracker")
+    notice = st.session_state.pop("budget_notice", None)
+    ledger = get_ledger(get_data())
+    add_expense = st.number_input("Add expense (₹)", min_value=0, step=10)
+    expense_category = st.selectbox("Category", EXPENSE_CATEGORIES)
+    expense_note = st.text_input("Note (e.g. Groceries, Vegetables)")
+    if st.button("➕ Add Expense"):
+        if add_expense > 0:
+            ledger_add(ledger, add_expense, expense_category, expense_note)
+            get_data()["history"].append({
+                "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                "type": "Expense",
+                "question": expense_note or "Expense added",
+                "answer": f"₹{add_expense} spent"
+            })
+            save_data(get_data())
+            limit = get_data()["budget"]["monthly_limit"]
+            spent = month_spent(ledger)
+            if limit > 0 and spent > limit * 0.9:
+                st.session_state.budget_notice = ("warning", f"⚠️ Alert! You've spent ₹{spent} out of ₹{limit} budget!")
+            else:
+                st.session_state.budget_notice = ("success", f"✅ ₹{add_expense} added. Total spent this month: ₹{spent}")
+            # Full rerun so the sidebar budget bar picks up the new total
+            st.rerun()
+
+    if notice:
+        getattr(st, notice[0])(notice[1])
+
+    st.markdown(f"**This month:** ₹{month_spent(ledger)} — totals roll over automatically each month")
+    quarter = category_spent(ledger, recent_months(3))
+    if quarter:
+        st.markdown("**Last 3 months by category**")
+        for category, amount in sorted(quarter.items(), key=lambda kv: -kv[1]):
+            st.markdown(f"• {category}: ₹{amount}")
+    trend = spending_trend(ledger)
+    if trend:
+        st.markdown("#### 📈 Spending Trend")
+        st.bar_chart(trend, x="Month", y="Spent (₹)", color="Category")
+
+@fragment
+def wishlist_panel():
+    """Wishlist with per-item removal"""
+    st.markdown("### ❤️ My Wishlist")
+    if get_data()["wishlist"]:
+        for i, item in enumerate(get_data()["wishlist"]):
+            wish_col1, wish_col2 = st.columns([3, 1])
+            with wish_col1:
+                st.markdown(f"• **{item['name']}** — Added: {item['added']}")
+            with wish_col2:
+                if st.button("✅ Got it", key=f"wish_{i}"):
+                    get_data()["wishlist"].pop(i)
+                    save_data(get_data())
+                    st.rerun()
+    else:
+        st.markdown("""
+        <div class="feature-card">
+        <p style="color:#8892b0">No items in wishlist yet.<br>
+        Add products from Shopping Mode!</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+
+def render_tracker_tab():
+    """My Tracker tab"""
     st.markdown("## 📊 My Shopping Tracker")
 
     col1, col2 = st.columns([1, 1])
 
     with col1:
-        st.markdown("### 💰 Budget Tracker")
-        add_expense = st.number_input("Add expense (₹)", min_value=0, step=10)
-        expense_note = st.text_input("Note (e.g. Groceries, Vegetables)")
-        if st.button("➕ Add Expense"):
-            if add_expense > 0:
-                st.session_state.data["budget"]["spent"] += add_expense
-                st.session_state.data["history"].append({
-                    "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                    "type": "Expense",
-                    "question": expense_note or "Expense added",
-                    "answer": f"₹{add_expense} spent"
-                })
-                save_data(st.session_state.data)
-                limit = st.session_state.data["budget"]["monthly_limit"]
-                spent = st.session_state.data["budget"]["spent"]
-                if limit > 0 and spent > limit * 0.9:
-                    st.warning(f"⚠️ Alert! You've spent ₹{spent} out of ₹{limit} budget!")
-                else:
-                    st.success(f"✅ ₹{add_expense} added. Total spent: ₹{st.session_state.data['budget']['spent']}")
-
-        if st.button("🔄 Reset Monthly Budget"):
-            st.session_state.data["budget"]["spent"] = 0
-            save_data(st.session_state.data)
-            st.success("Budget reset for new month!")
+        budget_panel()
 
     with col2:
-        st.markdown("### ❤️ My Wishlist")
-        if st.session_state.data["wishlist"]:
-            for i, item in enumerate(st.session_state.data["wishlist"]):
-                wish_col1, wish_col2 = st.columns([3, 1])
-                with wish_col1:
-                    st.markdown(f"• **{item['name']}** — Added: {item['added']}")
-                with wish_col2:
-                    if st.button("✅ Got it", key=f"wish_{i}"):
-                        st.session_state.data["wishlist"].pop(i)
-                        save_data(st.session_state.data)
-                        st.rerun()
-        else:
-            st.markdown("""
-            <div class="feature-card">
-            <p style="color:#8892b0">No items in wishlist yet.<br>
-            Add products from Shopping Mode!</p>
-            </div>
-            """, unsafe_allow_html=True)
+        wishlist_panel()
 
 # ═══════════════════════════════════════════════
 # TAB 5 — HISTORY
 # ═══════════════════════════════════════════════
-with tab5:
+@fragment
+def render_history_tab():
+    """Shopping History tab"""
     st.markdown("## 📋 Shopping & Food History")
 
-    if st.session_state.data["history"]:
+    if get_data()["history"]:
         if st.button("🗑️ Clear History"):
-            st.session_state.data["history"] = []
-            save_data(st.session_state.data)
+            get_data()["history"] = []
+            get_data()["scans"] = []
+            st.session_state.pop("scan_index", None)
+            save_data(get_data())
             st.rerun()
 
-        for item in reversed(st.session_state.data["history"][-20:]):
+        for item in reversed(get_data()["history"][-20:]):
             emoji = "🛒" if item["type"] == "Shopping" else "🍜" if item["type"] == "Street Food" else "💰"
             st.markdown(f"""
             <div class="feature-card">
@@ -973,4 +2190,23 @@ with tab5:
         Start scanning products and food to build your history!
         </p>
         </div>
-        """, unsafe_allow_html=True)
\ No newline at end of file
+        """, unsafe_allow_html=True)
+
+# ─────────────────────────────────────────────
+# MAIN TABS
+# ─────────────────────────────────────────────
+# Only the selected tab is rendered; panels inside it are fragments
+# that rerun on their own when their widgets change.
+TABS = {
+    "🛒 Shopping Mode": lambda: render_shopping_tab(prefetch_enabled),
+    "🍜 Street Food Mode": render_street_food_tab,
+    "🎤 Voice Assistant": lambda: render_voice_tab(voice_enabled),
+    "📊 My Tracker": render_tracker_tab,
+    "📋 Shopping History": render_history_tab
+}
+active_tab = st.radio("Mode", list(TABS), horizontal=True, label_visibility="collapsed", key="active_tab")
+TABS[active_tab]()
+
+profile = get_startup_profile()
+if profile["first_run_seconds"] is None:
+    profile["first_run_seconds"] = time.perf_counter() - SCRIPT_START
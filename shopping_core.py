@@ -0,0 +1,269 @@
+"""Streamlit-free helpers behind app.py: backend routing, label parsing, scan index and ledger"""
+import calendar
+import re
+import threading
+import time
+from datetime import date, datetime
+
+# ─────────────────────────────────────────────
+# OLLAMA BACKEND POOL
+# ─────────────────────────────────────────────
+
+BACKEND_HEALTH_INTERVAL = 15
+BACKEND_RETRY_SECONDS = 30
+
+def parse_backends(spec):
+    """Parse OLLAMA_BACKENDS into {url: set of models, or None for all models}"""
+    backends = {}
+    for entry in spec.split(","):
+        url, _, models = entry.strip().partition("=")
+        if url:
+            backends[url.rstrip("/")] = {m.strip() for m in models.split("|") if m.strip()} or None
+    return backends
+
+def new_backend_pool(spec):
+    """Backend pool for an OLLAMA_BACKENDS spec, every backend starting healthy"""
+    pool = {"lock": threading.Lock(), "backends": {}}
+    for url, models in parse_backends(spec).items():
+        pool["backends"][url] = {"url": url, "models": models, "in_flight": 0, "healthy": True, "retry_at": 0.0}
+    return pool
+
+def mark_backend(pool, backend, healthy):
+    """Eject a failing backend, or re-admit one that answered"""
+    with pool["lock"]:
+        backend["healthy"] = healthy
+        backend["retry_at"] = 0.0 if healthy else time.time() + BACKEND_RETRY_SECONDS
+
+def check_backends(pool):
+    """Ping every backend once, ejecting or re-admitting it"""
+    import requests
+    for backend in list(pool["backends"].values()):
+        try:
+            ok = requests.get(f"{backend['url']}/api/tags", timeout=5).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        mark_backend(pool, backend, ok)
+
+def run_backend_health_checks(pool, interval=BACKEND_HEALTH_INTERVAL):
+    """Ping every backend periodically so ejected ones are re-admitted"""
+    while True:
+        try:
+            check_backends(pool)
+        except Exception:
+            # Anything escaping would end the thread and keep ejected backends out for good
+            pass
+        time.sleep(interval)
+
+def pick_backend(pool, model, tried):
+    """Least-outstanding-requests backend serving this model, healthy ones first"""
+    with pool["lock"]:
+        now = time.time()
+        candidates = [b for b in pool["backends"].values()
+                      if b["url"] not in tried and (b["models"] is None or model in b["models"])]
+        live = [b for b in candidates if b["healthy"] or b["retry_at"] <= now] or candidates
+        if not live:
+            return None
+        backend = min(live, key=lambda b: b["in_flight"])
+        backend["in_flight"] += 1
+        return backend
+
+def send_to_backends(pool, path, payload, timeout, stream=False):
+    """POST to the best backend for payload["model"], failing over on connection errors"""
+    import requests
+    tried = set()
+    while True:
+        backend = pick_backend(pool, payload["model"], tried)
+        if backend is None:
+            raise requests.exceptions.ConnectionError(f"No Ollama backend available for {payload['model']}")
+        tried.add(backend["url"])
+        try:
+            response = requests.post(f"{backend['url']}{path}", json=payload, timeout=timeout, stream=stream)
+            mark_backend(pool, backend, True)
+            return response
+        except requests.exceptions.ConnectionError:
+            mark_backend(pool, backend, False)
+        finally:
+            with pool["lock"]:
+                backend["in_flight"] -= 1
+
+# ─────────────────────────────────────────────
+# LABEL PARSING
+# ─────────────────────────────────────────────
+
+MONTHS = {m: i for i, m in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], 1)}
+UNIT_FACTORS = {
+    "KG": (1000, "g"), "G": (1, "g"), "GM": (1, "g"), "GMS": (1, "g"), "GRAM": (1, "g"),
+    "GRAMS": (1, "g"), "MG": (0.001, "g"), "L": (1000, "ml"), "LTR": (1000, "ml"),
+    "LITRE": (1000, "ml"), "LITRES": (1000, "ml"), "LITER": (1000, "ml"),
+    "LITERS": (1000, "ml"), "ML": (1, "ml")
+}
+QUANTITY_PATTERN = r"(\d+(?:\.\d+)?)\s*(KG|GMS|GM|GRAMS|GRAM|G|MG|ML|LTR|LITRES|LITRE|LITERS|LITER|L)\b"
+DATE_PATTERN = r"(\d{1,2}[/.\-]\d{1,2}[/.\-]\d{2,4}|\d{1,2}[/.\-](?:\d{4}|\d{2})(?!\d)|(?:\d{1,2}\s*)?[A-Z]{3}[A-Z]*[\s/.\-]*\d{2,4})"
+MFG_LABELS = r"MFG|MFD|MFGD|PKD|PACKED|MANUFACTURED|DOM"
+EXP_LABELS = r"EXP|EXPIRY|EXPIRES|USE BY|BEST BEFORE|BB"
+
+def parse_label_date(raw, end_of_month=False):
+    """Parse a printed date like 12/03/25, 03/2025, 03/25 or 12 MAR 2025"""
+    raw = raw.strip().upper()
+    day = None
+    m = re.fullmatch(r"(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2,4})", raw)
+    if m:
+        day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    else:
+        m = re.fullmatch(r"(\d{1,2})[/.\-](\d{4}|\d{2})", raw)
+        if m:
+            month, year = int(m.group(1)), int(m.group(2))
+        else:
+            m = re.fullmatch(r"(?:(\d{1,2})\s*)?([A-Z]{3})[A-Z]*[\s/.\-]*(\d{2,4})", raw)
+            if not m or m.group(2) not in MONTHS:
+                return None
+            day = int(m.group(1)) if m.group(1) else None
+            month, year = MONTHS[m.group(2)], int(m.group(3))
+    if year < 100:
+        year += 2000
+    try:
+        if day is None:
+            day = calendar.monthrange(year, month)[1] if end_of_month else 1
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+def add_months(d, months):
+    """Shift a date by whole months, clamping to the end of the month"""
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+def parse_label_text(text):
+    """Pull MRP, net quantity and MFG/EXP dates out of OCR label text"""
+    upper = text.upper()
+    facts = {"mrp": None, "quantity": None, "unit": None, "mfg": None, "exp": None}
+
+    # Unit sale price lines ("₹0.45 per g") are mandatory on Indian packs and are not the MRP
+    priced = re.sub(r"UNIT\s*SALE\s*PRICE[^\n]*", "", upper)
+    m = re.search(r"\bM\.?\s?R\.?\s?P\b\.?[^0-9\n]{0,30}?(\d[\d,]*(?:\.\d{1,2})?)", priced) \
+        or re.search(r"(?:\bRS\.?|₹)\s*(\d[\d,]*(?:\.\d{1,2})?)(?![\d.,]*\s*(?:/|PER\b))", priced)
+    if m:
+        facts["mrp"] = float(m.group(1).replace(",", ""))
+
+    # Only trust a quantity stated as the net content, not serving sizes or nutrition rows
+    m = re.search(r"\bNET\s*(?:WT|WEIGHT|QTY|QUANTITY|VOL|VOLUME|CONTENTS?)?\.?\s*[:.\-]?\s*" + QUANTITY_PATTERN, upper)
+    if m:
+        factor, unit = UNIT_FACTORS[m.group(2)]
+        facts["quantity"], facts["unit"] = float(m.group(1)) * factor, unit
+
+    m = re.search(rf"\b(?:{MFG_LABELS})\b\.?\s*(?:DATE|DT|ON)?\s*[:.\-]?\s*{DATE_PATTERN}", upper)
+    if m:
+        facts["mfg"] = parse_label_date(m.group(1))
+    m = re.search(rf"\b(?:{EXP_LABELS})\b\.?\s*(?:DATE|DT|ON)?\s*[:.\-]?\s*{DATE_PATTERN}", upper)
+    if m:
+        facts["exp"] = parse_label_date(m.group(1), end_of_month=True)
+    if not facts["exp"] and facts["mfg"]:
+        m = re.search(r"BEST\s*BEFORE\s*(\d{1,2})\s*MONTHS?", upper)
+        if m:
+            facts["exp"] = add_months(facts["mfg"], int(m.group(1)))
+    return facts
+
+def to_number(value):
+    """First number in an LLM field like 45, "₹45.00" or "12 g", else None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    m = re.search(r"\d+(?:\.\d+)?", str(value or "").replace(",", ""))
+    return float(m.group()) if m else None
+
+# ─────────────────────────────────────────────
+# SCAN INDEX
+# ─────────────────────────────────────────────
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+def bk_insert(tree, key, item):
+    """Add an item to a BK-tree keyed by Hamming distance"""
+    if tree["root"] is None:
+        tree["root"] = {"hash": key, "items": [item], "children": {}}
+        return
+    node = tree["root"]
+    while True:
+        distance = hamming(key, node["hash"])
+        if distance == 0:
+            node["items"].append(item)
+            return
+        if distance not in node["children"]:
+            node["children"][distance] = {"hash": key, "items": [item], "children": {}}
+            return
+        node = node["children"][distance]
+
+def bk_search(tree, key, max_distance):
+    """All (distance, item) pairs within max_distance, nearest first"""
+    found, stack = [], [tree["root"]] if tree["root"] else []
+    while stack:
+        node = stack.pop()
+        distance = hamming(key, node["hash"])
+        if distance <= max_distance:
+            found += [(distance, item) for item in node["items"]]
+        for d, child in node["children"].items():
+            if distance - max_distance <= d <= distance + max_distance:
+                stack.append(child)
+    return sorted(found, key=lambda pair: pair[0])
+
+# ─────────────────────────────────────────────
+# EXPENSE LEDGER
+# ─────────────────────────────────────────────
+
+TREND_MONTHS = 6
+
+def month_key(day):
+    """Ledger rollup key for the month containing a date"""
+    return day.strftime("%Y-%m")
+
+def recent_months(count, day=None):
+    """Month keys for the last count months, oldest first"""
+    day = day or date.today()
+    return [month_key(add_months(day.replace(day=1), -i)) for i in reversed(range(count))]
+
+def ledger_add(ledger, amount, category, note="", day=None):
+    """Append an expense and update the per-month and per-category rollups"""
+    day = day or date.today()
+    month = month_key(day)
+    ledger["entries"].append({"date": day.isoformat(), "amount": amount, "category": category, "note": note})
+    ledger["monthly"][month] = ledger["monthly"].get(month, 0) + amount
+    categories = ledger["by_category"].setdefault(month, {})
+    categories[category] = categories.get(category, 0) + amount
+
+def get_ledger(data):
+    """Expense ledger, migrated from old Expense history rows on first use"""
+    if "ledger" not in data:
+        ledger = {"entries": [], "monthly": {}, "by_category": {}}
+        for item in data["history"]:
+            amount = to_number(item["answer"]) if item["type"] == "Expense" else None
+            if amount:
+                day = datetime.strptime(item["timestamp"], "%d/%m/%Y %H:%M").date()
+                ledger_add(ledger, int(amount) if amount.is_integer() else amount, "Other", item["question"], day)
+        # The old tracker's running total never reset by itself and survives history being
+        # cleared; keep only what none of the migrated rows, in any month, already explain
+        uncovered = data.get("budget", {}).pop("spent", 0) - sum(ledger["monthly"].values())
+        if uncovered > 0:
+            ledger_add(ledger, uncovered, "Other", "Carried over from the old budget tracker")
+        data["ledger"] = ledger
+    return data["ledger"]
+
+def month_spent(ledger, day=None):
+    """Total spent in a month, today's month by default"""
+    return ledger["monthly"].get(month_key(day or date.today()), 0)
+
+def category_spent(ledger, months):
+    """Per-category totals over a list of month keys"""
+    totals = {}
+    for month in months:
+        for category, amount in ledger["by_category"].get(month, {}).items():
+            totals[category] = totals.get(category, 0) + amount
+    return totals
+
+def spending_trend(ledger, months=TREND_MONTHS):
+    """Chart rows of monthly spend per category"""
+    return [{"Month": month, "Category": category, "Spent (₹)": amount}
+            for month in recent_months(months)
+            for category, amount in ledger["by_category"].get(month, {}).items()]
@@ -0,0 +1,134 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import shopping_core
+from shopping_core import (
+    check_backends, mark_backend, new_backend_pool, parse_backends, pick_backend,
+    run_backend_health_checks, send_to_backends
+)
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Answers /api/tags and /api/generate with the server's own name"""
+
+    def do_GET(self):
+        self.reply({"models": []})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply({"response": self.server.name, "done": True})
+
+    def reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(name):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+        server.name = name
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dead_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_parse_backends():
+    assert parse_backends("http://a:1/=llava|llama3, http://b:2") == {
+        "http://a:1": {"llava", "llama3"}, "http://b:2": None
+    }
+
+
+def test_pick_prefers_least_outstanding_serving_the_model():
+    pool = new_backend_pool("http://a=llava,http://b,http://c=llama3")
+    pool["backends"]["http://a"]["in_flight"] = 2
+    backend = pick_backend(pool, "llava", set())
+    assert backend["url"] == "http://b" and backend["in_flight"] == 1
+    assert pick_backend(pool, "llava", {"http://b"})["url"] == "http://a"
+    assert pick_backend(pool, "llava", {"http://a", "http://b"}) is None
+
+
+def test_ejected_backend_skipped_until_retry():
+    pool = new_backend_pool("http://a,http://b")
+    a, b = pool["backends"]["http://a"], pool["backends"]["http://b"]
+    b["in_flight"] = 5
+    mark_backend(pool, a, False)
+    assert pick_backend(pool, "llava", set()) is b
+    a["retry_at"] = time.time() - 1
+    assert pick_backend(pool, "llava", set()) is a
+
+
+def test_all_ejected_still_tries_one():
+    pool = new_backend_pool("http://a")
+    mark_backend(pool, pool["backends"]["http://a"], False)
+    assert pick_backend(pool, "llava", set())["url"] == "http://a"
+
+
+def test_failover_to_live_backend(fake_server):
+    pytest.importorskip("requests")
+    dead, live = dead_url(), fake_server("live")
+    pool = new_backend_pool(f"{dead},{live}")
+    pool["backends"][live]["in_flight"] = 1
+    response = send_to_backends(pool, "/api/generate", {"model": "llava"}, timeout=5)
+    assert response.json()["response"] == "live"
+    assert not pool["backends"][dead]["healthy"]
+    assert pool["backends"][dead]["retry_at"] > time.time()
+    assert [b["in_flight"] for b in pool["backends"].values()] == [0, 1]
+
+
+def test_no_live_backend_raises(fake_server):
+    requests = pytest.importorskip("requests")
+    pool = new_backend_pool(dead_url())
+    with pytest.raises(requests.exceptions.ConnectionError):
+        send_to_backends(pool, "/api/generate", {"model": "llava"}, timeout=5)
+
+
+def test_health_check_readmits_and_ejects(fake_server):
+    pytest.importorskip("requests")
+    dead, live = dead_url(), fake_server("live")
+    pool = new_backend_pool(f"{dead},{live}")
+    mark_backend(pool, pool["backends"][live], False)
+    check_backends(pool)
+    assert pool["backends"][live]["healthy"] and pool["backends"][live]["retry_at"] == 0.0
+    assert not pool["backends"][dead]["healthy"]
+
+
+def test_health_thread_survives_unexpected_errors(monkeypatch):
+    calls, recovered = [], threading.Event()
+
+    def flaky_check(pool):
+        calls.append(pool)
+        if len(calls) == 1:
+            raise KeyError("url")
+        recovered.set()
+        threading.Event().wait()  # park the daemon thread instead of polling for the rest of the run
+
+    monkeypatch.setattr(shopping_core, "check_backends", flaky_check)
+    pool = new_backend_pool("http://a")
+    threading.Thread(target=run_backend_health_checks, args=(pool, 0.01), daemon=True).start()
+    assert recovered.wait(timeout=5)
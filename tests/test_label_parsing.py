@@ -0,0 +1,73 @@
+from datetime import date
+
+from shopping_core import add_months, parse_label_date, parse_label_text, to_number
+
+
+def test_parse_label_date_formats():
+    assert parse_label_date("12/03/25") == date(2025, 3, 12)
+    assert parse_label_date("12.03.2025") == date(2025, 3, 12)
+    assert parse_label_date("03/2025") == date(2025, 3, 1)
+    assert parse_label_date("03/2025", end_of_month=True) == date(2025, 3, 31)
+    assert parse_label_date("06/26") == date(2026, 6, 1)
+    assert parse_label_date("02/24", end_of_month=True) == date(2024, 2, 29)
+    assert parse_label_date("12 MAR 2025") == date(2025, 3, 12)
+    assert parse_label_date("FEB 24", end_of_month=True) == date(2024, 2, 29)
+
+
+def test_parse_label_date_rejects_nonsense():
+    assert parse_label_date("31/02/2025") is None
+    assert parse_label_date("12 XYZ 2025") is None
+
+
+def test_add_months_clamps_to_month_end():
+    assert add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert add_months(date(2024, 11, 15), 3) == date(2025, 2, 15)
+    assert add_months(date(2024, 3, 1), -3) == date(2023, 12, 1)
+
+
+def test_mrp_and_net_quantity():
+    facts = parse_label_text("M.R.P. Rs. 1,250.50 (incl. of all taxes)\nNet Wt. 1 kg")
+    assert facts["mrp"] == 1250.5
+    assert (facts["quantity"], facts["unit"]) == (1000, "g")
+
+
+def test_unit_sale_price_is_not_the_mrp():
+    facts = parse_label_text("Unit sale price: Rs 0.45 per g\nMRP Rs 45.00\nNet Qty: 100 g")
+    assert facts["mrp"] == 45
+    facts = parse_label_text("UNIT SALE PRICE ₹0.45/G\n₹45")
+    assert facts["mrp"] == 45
+
+
+def test_quantity_needs_net_context():
+    facts = parse_label_text("MRP 45\nServing size 30 g\nProtein 5 g")
+    assert facts["quantity"] is None and facts["unit"] is None
+    facts = parse_label_text("NET VOLUME: 500 ml\nServing size 200 ml")
+    assert (facts["quantity"], facts["unit"]) == (500, "ml")
+
+
+def test_mfg_and_exp_dates():
+    facts = parse_label_text("MFG. DATE: 05/2024\nEXP: 04/2025")
+    assert facts["mfg"] == date(2024, 5, 1)
+    assert facts["exp"] == date(2025, 4, 30)
+
+
+def test_month_and_two_digit_year():
+    facts = parse_label_text("MFD 01/25\nEXP 12/25")
+    assert facts["mfg"] == date(2025, 1, 1)
+    assert facts["exp"] == date(2025, 12, 31)
+    assert parse_label_text("BEST BEFORE 06/26")["exp"] == date(2026, 6, 30)
+    assert parse_label_text("EXP 13/25")["exp"] is None
+
+
+def test_best_before_months_after_mfg():
+    facts = parse_label_text("PKD: 15 JAN 2025\nBest before 6 months from packaging")
+    assert facts["mfg"] == date(2025, 1, 15)
+    assert facts["exp"] == date(2025, 7, 15)
+
+
+def test_to_number():
+    assert to_number(45) == 45.0
+    assert to_number("₹1,299.50") == 1299.5
+    assert to_number("12 g") == 12.0
+    assert to_number(None) is None
+    assert to_number(True) is None
@@ -0,0 +1,80 @@
+from datetime import date
+
+from shopping_core import (
+    category_spent, get_ledger, ledger_add, month_key, month_spent, recent_months, spending_trend
+)
+
+
+def new_ledger():
+    return {"entries": [], "monthly": {}, "by_category": {}}
+
+
+def test_ledger_add_updates_rollups():
+    ledger = new_ledger()
+    ledger_add(ledger, 100, "Groceries", "rice", date(2025, 1, 5))
+    ledger_add(ledger, 50, "Snacks", day=date(2025, 1, 20))
+    ledger_add(ledger, 30, "Groceries", day=date(2025, 2, 1))
+    assert len(ledger["entries"]) == 3
+    assert ledger["monthly"] == {"2025-01": 150, "2025-02": 30}
+    assert ledger["by_category"]["2025-01"] == {"Groceries": 100, "Snacks": 50}
+    assert month_spent(ledger, date(2025, 1, 31)) == 150
+    assert month_spent(ledger, date(2025, 3, 1)) == 0
+    assert category_spent(ledger, ["2025-01", "2025-02"]) == {"Groceries": 130, "Snacks": 50}
+
+
+def test_recent_months_crosses_year_end():
+    assert recent_months(3, date(2025, 2, 28)) == ["2024-12", "2025-01", "2025-02"]
+
+
+def test_spending_trend_rows():
+    ledger = new_ledger()
+    ledger_add(ledger, 80, "Dairy")
+    rows = spending_trend(ledger, 2)
+    assert rows == [{"Month": month_key(date.today()), "Category": "Dairy", "Spent (₹)": 80}]
+
+
+def test_migrates_expense_history_rows():
+    data = {"history": [
+        {"timestamp": "05/01/2025 10:00", "type": "Expense", "question": "Veg", "answer": "₹120 spent"},
+        {"timestamp": "06/01/2025 10:00", "type": "Shopping", "question": "Is it good?", "answer": "Yes"}
+    ], "budget": {"monthly_limit": 1000, "spent": 0}}
+    ledger = get_ledger(data)
+    assert ledger["monthly"] == {"2025-01": 120}
+    assert ledger["entries"][0]["note"] == "Veg"
+    assert "spent" not in data["budget"]
+    assert get_ledger(data) is ledger
+
+
+def test_migration_carries_over_uncovered_budget_total():
+    today = date.today()
+    data = {"history": [
+        {"timestamp": today.strftime("%d/%m/%Y 09:00"), "type": "Expense", "question": "Fruit", "answer": "₹200 spent"}
+    ], "budget": {"monthly_limit": 0, "spent": 500}}
+    ledger = get_ledger(data)
+    assert month_spent(ledger) == 500
+    assert ledger["by_category"][month_key(today)] == {"Other": 500}
+
+
+def test_migration_after_cleared_history():
+    data = {"history": [], "budget": {"monthly_limit": 0, "spent": 350}}
+    assert month_spent(get_ledger(data)) == 350
+
+
+def test_migration_does_not_rebook_past_months():
+    data = {"history": [
+        {"timestamp": "05/01/2025 10:00", "type": "Expense", "question": "Veg", "answer": "₹120 spent"}
+    ], "budget": {"monthly_limit": 0, "spent": 120}}
+    ledger = get_ledger(data)
+    assert ledger["monthly"] == {"2025-01": 120}
+    assert month_spent(ledger) == 0
+
+
+def test_migration_carries_over_only_the_unexplained_part():
+    today = date.today()
+    data = {"history": [
+        {"timestamp": "05/01/2020 10:00", "type": "Expense", "question": "Veg", "answer": "₹100 spent"},
+        {"timestamp": today.strftime("%d/%m/%Y 09:00"), "type": "Expense", "question": "Fruit", "answer": "₹50 spent"}
+    ], "budget": {"monthly_limit": 0, "spent": 400}}
+    ledger = get_ledger(data)
+    assert ledger["monthly"]["2020-01"] == 100
+    assert month_spent(ledger) == 300
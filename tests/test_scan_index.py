@@ -0,0 +1,40 @@
+from shopping_core import bk_insert, bk_search, hamming
+
+
+def build(keys):
+    tree = {"root": None}
+    for key in keys:
+        bk_insert(tree, key, f"item-{key:x}")
+    return tree
+
+
+def test_hamming():
+    assert hamming(0b1011, 0b1011) == 0
+    assert hamming(0b1011, 0b0010) == 2
+    assert hamming(0, 2 ** 64 - 1) == 64
+
+
+def test_search_empty_tree():
+    assert bk_search({"root": None}, 0x1234, 8) == []
+
+
+def test_search_finds_near_keys_nearest_first():
+    tree = build([0x0, 0x1, 0x3, 0xFF, 0xFFFF])
+    found = bk_search(tree, 0x0, 2)
+    assert [distance for distance, _ in found] == [0, 1, 2]
+    assert [item for _, item in found] == ["item-0", "item-1", "item-3"]
+
+
+def test_search_matches_brute_force():
+    keys = [(i * 0x9E3779B97F4A7C15) & (2 ** 64 - 1) for i in range(200)]
+    tree = build(keys)
+    query = keys[17] ^ 0b10110
+    expected = sorted(hamming(query, k) for k in keys if hamming(query, k) <= 12)
+    assert [distance for distance, _ in bk_search(tree, query, 12)] == expected
+
+
+def test_duplicate_keys_share_a_node():
+    tree = {"root": None}
+    bk_insert(tree, 0xABC, "first")
+    bk_insert(tree, 0xABC, "second")
+    assert [item for _, item in bk_search(tree, 0xABC, 0)] == ["first", "second"]